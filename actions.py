@@ -6,9 +6,14 @@ if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
     from game_map import GameMap
-from procgen import pop_clears, correct_char
+from replay import CHORD, FLAG, FLAG_AROUND, REVEAL, REVEAL_ALL, REVEAL_AREA
 from tcod import event as ev
-import numpy as np
+
+def mouse_tile(context) -> Tuple[int, int]:
+    """The console tile under the mouse right now"""
+    mouse = ev.get_mouse_state()
+    context.convert_event(mouse)
+    return(mouse.tile)
 
 class Action:
     def perform(self, engine: Engine, entity: Entity = None) -> None:
@@ -26,6 +31,11 @@ class EscapeAction(Action):
     def perform(self, engine: Engine, entity: Entity = None) -> None:
         raise SystemExit()
 
+class NewGameAction(Action):
+    def perform(self, engine: Engine, entity: Entity = None) -> None:
+        """Give up the current game for the next map from the engine's pool"""
+        engine.new_game()
+
 class MovementAction(Action):
     def __init__(self, dx: int, dy: int):
         super().__init__()
@@ -34,9 +44,10 @@ class MovementAction(Action):
         self.dy = dy
 
     def perform(self, engine: Engine, entity: Entity = None) -> None:
-        dest_x = entity.x + self.dx
-        dest_y = entity.y + self.dy
-
+        """Move the entity if given one, otherwise pan the engine's camera"""
+        if entity is None:
+            engine.camera.move(self.dx, self.dy)
+            return
         entity.move(self.dx, self.dy)
 
 class MouseAction(Action):
@@ -47,28 +58,58 @@ class MouseAction(Action):
         self.gamemap = gamemap
 
     def perform(self, engine: Engine, entity: Entity = None) -> None:
-        if self.tile_pos[1] < np.shape(self.gamemap.tiles)[1] and not self.gamemap.tiles[self.tile_pos]['explosive']:
-            if not self.gamemap.tiles[self.tile_pos]['numbomb']:
-                pop_clears(self.tile_pos, self.gamemap)
-            else: self.gamemap.revealed[self.tile_pos] = True
-        else: print('bomb')
+        """Reveal the map tile under the clicked console tile, through the engine's camera"""
+        tile = engine.camera.to_map(self.tile_pos)
+        if tile is not None: engine.play(REVEAL, tile)
 
 class SpaceAction(Action):
     def __init__(self, event, context, gamemap):
         super().__init__()
-        self.mouse_pos = ev.get_mouse_state()
-        context.convert_event(self.mouse_pos)
-        self.mouse_pos = self.mouse_pos.tile
+        self.mouse_pos = mouse_tile(context)
         self.gamemap = gamemap
         
     def perform(self, engine, entity = None):
-        if self.mouse_pos[1] < np.shape(self.gamemap.tiles)[1]:
-            if not (self.gamemap.tiles[self.mouse_pos]['flagged']):
-                self.gamemap.tiles[self.mouse_pos]['flagged'] = True
-                self.gamemap.revealed[self.mouse_pos] = True
-                self.gamemap.tiles[self.mouse_pos]['light'] = (ord('F'), (0, 0, 0), (130, 110, 50))
-            else: 
-                self.gamemap.tiles[self.mouse_pos]['flagged'] = False
-                self.gamemap.revealed[self.mouse_pos] = False
-                self.gamemap.tiles[self.mouse_pos]['light'] = (ord(
-                    correct_char(self.mouse_pos, self.gamemap)), (255, 255, 255), (130, 110, 50))
\ No newline at end of file
+        """Toggle a flag on the hidden map tile under the mouse"""
+        tile = engine.camera.to_map(self.mouse_pos)
+        if tile is not None: engine.play(FLAG, tile)
+
+class ChordAction(Action):
+    def __init__(self, tile_pos: Tuple[int, int]):
+        super().__init__()
+        self.tile_pos = tile_pos
+
+    def perform(self, engine: Engine, entity: Entity = None) -> None:
+        """Reveal the hidden tiles around the number at a console tile, if it has as many flags around it as bombs"""
+        tile = engine.camera.to_map(self.tile_pos)
+        if tile is not None: engine.play(CHORD, tile)
+
+class FlagAroundAction(Action):
+    def __init__(self, tile_pos: Tuple[int, int]):
+        super().__init__()
+        self.tile_pos = tile_pos
+
+    def perform(self, engine: Engine, entity: Entity = None) -> None:
+        """Flag the hidden tiles around the number at a console tile, if they must all be bombs"""
+        tile = engine.camera.to_map(self.tile_pos)
+        if tile is not None: engine.play(FLAG_AROUND, tile)
+
+class AreaRevealAction(Action):
+    def __init__(self, start: Tuple[int, int], end: Tuple[int, int]):
+        super().__init__()
+        self.start, self.end = start, end
+
+    def perform(self, engine: Engine, entity: Entity = None) -> None:
+        """Reveal every hidden, unflagged tile in the rectangle between two console tiles, corners included"""
+        camera = engine.camera
+        x0, x1 = sorted((self.start[0], self.end[0]))
+        y0, y1 = sorted((self.start[1], self.end[1]))
+        # Corners outside the view are pulled in to its edge
+        x0, x1 = max(x0, 0), min(x1, camera.width-1)
+        y0, y1 = max(y0, 0), min(y1, camera.height-1)
+        if x0 > x1 or y0 > y1: return
+        engine.play(REVEAL_AREA, camera.to_map((x0, y0)), camera.to_map((x1, y1)))
+
+class RevealAllAction(Action):
+    def perform(self, engine: Engine, entity: Entity = None) -> None:
+        """Reveal every safe tile, to see the rest of the map once a game is over"""
+        if engine.game_over: engine.play(REVEAL_ALL, (0, 0))
@@ -0,0 +1,110 @@
+"""Measuring what a generated map turned out like, so generators can be tuned against numbers.
+
+analyze labels the map's connected safe regions and blank (zero) regions with
+regions.label_regions and reports, all from whole-array operations:
+
+    bomb_percent       the actual share of bombs, and density_error its distance from the request
+    safe_regions       count and sizes of the 8-connected regions of safe tiles
+    zero_regions       count and sizes of the blank regions a click opens in one go
+    largest_opening    the most tiles one click can reveal: a blank region and its numbered border
+    start_revealed     tiles revealed so far, which on a fresh map is the start opening
+    start_region       the safe region the start opened into, all a player can reach without
+                       crossing bombs
+    frontier           revealed tiles next to a hidden one, where play goes on from
+
+Region sizes come as a count, largest, mean and median, and a histogram counting the regions of
+1, 2-3, 4-7, ... tiles. generate_map(..., analyze=True) adds the results to its report's metrics.
+Run `python analysis.py` to generate and analyze maps, or with --map to analyze saved ones,
+printing one JSON object per map."""
+from __future__ import annotations
+
+from typing import Optional
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import procgen
+import tile_types
+from map_cache import load_map
+from neighbors import circ_coords, count_adjacent
+from regions import ZeroRegionIndex, label_regions
+
+def size_stats(sizes: np.ndarray) -> dict:
+    """Summarize region sizes, with a histogram of them in powers of two"""
+    if not len(sizes): return({'count': 0, 'largest': 0, 'mean': 0.0, 'median': 0.0, 'histogram': []})
+    return({'count': len(sizes), 'largest': int(sizes.max()), 'mean': float(sizes.mean()),
+        'median': float(np.median(sizes)), 'histogram': np.bincount(np.log2(sizes).astype(np.intp)).tolist()})
+
+def opening_sizes(labels: np.ndarray, count: int, numbered: np.ndarray) -> np.ndarray:
+    """How many tiles revealing each blank region opens: the region and every numbered tile
+    touching it, a numbered tile touching several regions counting once for each"""
+    width, height = labels.shape
+    padded = np.zeros((width+2, height+2), dtype=labels.dtype, order='F')
+    padded[1:-1, 1:-1] = labels
+    # Flat positions in padded, where each neighbor is a fixed step away
+    xs, ys = np.nonzero(numbered)
+    at, flat = (xs+1)+(ys+1)*(width+2), padded.ravel(order='F')
+    around = [flat.take(at+dx+dy*(width+2)) for dx, dy in circ_coords]
+    openings = np.bincount(labels.ravel(order='K'), minlength=count+1)
+    # Each label around a numbered tile counts once, at the first of its neighbors holding it
+    for k, label in enumerate(around):
+        first = label != 0
+        for earlier in around[:k]: first &= label != earlier
+        openings += np.bincount(label[first], minlength=count+1)
+    return(openings[1:])
+
+def analyze(mine_map, desired_bomb_percent: Optional[float] = None) -> dict:
+    """Measure a map, see the module docstring. desired_bomb_percent defaults to the one the map
+    was generated with, if known"""
+    if desired_bomb_percent is None: desired_bomb_percent = getattr(mine_map, 'params', {}).get('desired_bomb_percent')
+    cells = np.asarray(mine_map.cells)
+    explosive = (cells & tile_types.EXPLOSIVE) != 0
+    revealed = (cells & tile_types.REVEALED) != 0
+    # Counted from the bombs, as unplayable maps never have their numbomb values set
+    blank = ~explosive & (count_adjacent(explosive) == 0)
+    tiles = cells.size
+    bomb_percent = 100*np.count_nonzero(explosive)/tiles
+    safe_labels, safe_boxes = label_regions(~explosive)
+    safe_sizes = np.bincount(safe_labels.ravel(order='K'), minlength=len(safe_boxes)+1)[1:]
+    # A map with a region index has its blank regions labeled already, if by the same numbers
+    index = mine_map.zero_regions
+    if isinstance(index, ZeroRegionIndex) and np.array_equal(blank, (cells & tile_types.BLANK_BITS) == 0):
+        zero_labels, zero_count = index.labels, len(index.boxes)
+    else:
+        zero_labels, zero_boxes = label_regions(blank)
+        zero_count = len(zero_boxes)
+    zero_sizes = np.bincount(np.asarray(zero_labels).ravel(order='K'), minlength=zero_count+1)[1:]
+    openings = opening_sizes(np.asarray(zero_labels), zero_count, ~explosive & ~blank) if zero_count else zero_sizes
+    start_labels = np.unique(safe_labels[revealed & ~explosive])
+    return({'tiles': tiles, 'bomb_percent': bomb_percent, 'desired_bomb_percent': desired_bomb_percent,
+        'density_error': None if desired_bomb_percent is None else bomb_percent-desired_bomb_percent,
+        'safe_regions': size_stats(safe_sizes), 'zero_regions': size_stats(zero_sizes),
+        'largest_opening': int(openings.max()) if len(openings) else 0,
+        'start_revealed': int(np.count_nonzero(revealed)),
+        'start_region': int(safe_sizes[start_labels[start_labels > 0]-1].max()) if start_labels.any() else 0,
+        'frontier': int(np.count_nonzero(revealed & (count_adjacent(~revealed) > 0)))})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--map', nargs='+', help='analyze these maps saved by map_cache rather than generating')
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--height', type=int, default=1000)
+    parser.add_argument('--percent', type=int, default=25, help='desired bomb percent')
+    parser.add_argument('--generator', default='batched', choices=['tendril', 'batched', 'parallel', 'noise'])
+    parser.add_argument('--unplayable', action='store_true', help='generate maps without the playable passes')
+    parser.add_argument('--seed', type=int, default=1234, help='seed of the first map')
+    parser.add_argument('--count', type=int, default=1, help='maps to generate, seeded one after another')
+    args = parser.parse_args(argv)
+    if args.map: maps = ((path, load_map(path)) for path in args.map)
+    else: maps = ((seed, procgen.generate_map(args.width, args.height, args.percent, not args.unplayable,
+        generator=args.generator, seed=seed)) for seed in range(args.seed, args.seed+args.count))
+    for source, mine_map in maps:
+        start = time.perf_counter()
+        stats = analyze(mine_map)
+        print(json.dumps({'map': source, **mine_map.params, **stats, 'seconds': time.perf_counter()-start}), flush=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
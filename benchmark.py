@@ -0,0 +1,293 @@
+"""Headless benchmarks for the hot paths of map generation, revealing and rendering.
+
+Run with `python benchmark.py` for the default sizes, or pass --sizes, --generator and
+--output. Results are printed as one JSON object per line so runs can be compared."""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import tcod.console
+
+import analysis
+import export
+import procgen
+import replay
+import server
+import solver
+from camera import Camera
+from chunked_map import ChunkedGameMap
+from game_state import GameState
+from map_cache import load_map, save_map
+from game_map import GameMap
+
+# Side length of the camera view in the panning render benchmark
+VIEW_SIZE = 100
+# Map sizes the solver is timed on
+SOLVER_SIZES = (500, 2000)
+# Map sizes no-guess generation is timed on
+NO_GUESS_SIZES = (100, 500)
+# Random actions replayed per map size
+REPLAY_ACTIONS = 200000
+# Map sizes the game server is load tested on, with this many games at once and requests per game
+SERVER_SIZES = (100, 500)
+SERVER_GAMES = 8
+SERVER_ACTIONS = 2000
+# Map sizes batch export is timed on, and the maps exported per batch
+EXPORT_BATCH_SIZES = (100, 500)
+EXPORT_BATCH = 8
+# The headless core: generation, game logic, solving, replays and the cache, none of which may need tcod
+CORE_MODULES = ('procgen', 'game_state', 'solver', 'replay', 'map_cache', 'chunked_map', 'pregen')
+
+def timed(function, repeat):
+    """Run function repeat times, returning the median and best wall time in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter()-start)
+    return(statistics.median(times), min(times))
+
+def result(name, size, repeat, times, **extra):
+    return({'name': name, 'size': size, 'repeat': repeat, 'median_seconds': times[0], 'best_seconds': times[1], **extra})
+
+def bench_import(repeat):
+    """Importing the headless core in fresh interpreters, as a worker process or a CLI tool
+    starts, next to importing numpy alone, and whether anything pulled in tcod on the way"""
+    def run(modules):
+        code = ('import sys, time\nstart = time.perf_counter()\n'
+            f'import {", ".join(modules)}\n'
+            "print(time.perf_counter()-start, any(name.split('.')[0] == 'tcod' for name in sys.modules))")
+        seconds, tcod_loaded = subprocess.run([sys.executable, '-c', code], capture_output=True,
+            text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        return(float(seconds), tcod_loaded == 'True')
+    numpy_times = [run(['numpy'])[0] for _ in range(repeat)]
+    core = [run(CORE_MODULES) for _ in range(repeat)]
+    times = [seconds for seconds, _ in core]
+    yield(result('import_core', None, repeat, (statistics.median(times), min(times)), modules=CORE_MODULES,
+        numpy_seconds=statistics.median(numpy_times), tcod_loaded=any(loaded for _, loaded in core)))
+
+def bench_generate(size, seed, generator, repeat):
+    """Whole generate_map runs, playable and not"""
+    for playable in (True, False):
+        times = timed(lambda: procgen.generate_map(size, size, 25, playable, generator=generator, seed=seed), repeat)
+        yield(result('generate_map', size, repeat, times, playable=playable, generator=generator))
+
+def bench_parallel(size, seed, workers, repeat):
+    """Playable generate_map runs with the parallel generator over pools of different sizes"""
+    for count in workers:
+        times = timed(lambda: procgen.generate_map(size, size, 25, True, generator='parallel', seed=seed, workers=count), repeat)
+        yield(result('generate_parallel', size, repeat, times, workers=count))
+
+def bench_fill_gaps(layout, seed, repeat):
+    """fill_gaps alone, on fresh copies of the same seeded layout"""
+    def run():
+        mine_map = GameMap(*layout.shape)
+        mine_map.explosive[:] = layout
+        procgen.fill_gaps(mine_map, procgen.make_rng(seed))
+    yield(result('fill_gaps', layout.shape[0], repeat, timed(run, repeat)))
+
+def bench_reveal(mine_map, seed, clicks):
+    """Clicks on random blank tiles from a hidden map, through the region index and through the flood.
+    The map is left revealed as it was found, so the benchmarks after start from its opening"""
+    blank = np.argwhere(mine_map.blank())
+    if not len(blank): return
+    found = mine_map.revealed[...]
+    picks = blank[np.random.default_rng(seed).integers(0, len(blank), clicks)]
+    index = mine_map.zero_regions
+    for name, regions in (('reveal_indexed', index), ('reveal_flood', None)):
+        if name == 'reveal_indexed' and index is None: continue
+        mine_map.zero_regions = regions
+        times, revealed = [], 0
+        for tile in picks:
+            mine_map.revealed[:] = False
+            start = time.perf_counter()
+            revealed += procgen.pop_clears(tile, mine_map)
+            times.append(time.perf_counter()-start)
+        yield(result(name, mine_map.width, clicks, (statistics.median(times), min(times)),
+            max_seconds=max(times), tiles_revealed=revealed))
+    mine_map.zero_regions = index
+    mine_map.revealed[...] = found
+
+def bench_flag_toggle(mine_map, seed, toggles):
+    """correct_char on random tiles, which reads the stored numbomb rather than recounting"""
+    rng = np.random.default_rng(seed)
+    tiles = [tuple(tile) for tile in rng.integers(0, (mine_map.width, mine_map.height), (toggles, 2))]
+    def run():
+        for tile in tiles: procgen.correct_char(tile, mine_map)
+    median, best = timed(run, 3)
+    yield(result('correct_char', mine_map.width, toggles, (median/toggles, best/toggles)))
+
+def bench_game_state(mine_map, repeat):
+    """The one full count GameState makes at the start of a game, after which it is updated per action"""
+    yield(result('game_state_init', mine_map.width, repeat, timed(lambda: GameState(mine_map), repeat)))
+
+def bench_solver(size, seed, generator):
+    """solver.play on a fresh playable map, revealing all it can prove from the start region.
+    Throughput is tiles resolved (revealed, or proven to be bombs) per second"""
+    mine_map = procgen.generate_map(size, size, 25, True, generator=generator, seed=seed)
+    start = time.perf_counter()
+    stats = solver.play(mine_map)
+    seconds = time.perf_counter()-start
+    resolved = stats['revealed']+stats['mines_found']
+    yield(result('solver_play', size, 1, (seconds, seconds), cells_per_second=resolved/seconds, **stats))
+
+def bench_no_guess(size, seed, generator):
+    """A playable generate_map with no_guess, split into the plain generation and the repairs"""
+    start = time.perf_counter()
+    report = procgen.generate_map(size, size, 25, True, generator=generator, seed=seed, no_guess=True).report
+    seconds = time.perf_counter()-start
+    phases = {stats.name: stats.seconds for stats in report.phases.values() if stats.name.startswith('no-guess')}
+    yield(result('generate_no_guess', size, 1, (seconds, seconds), phase_seconds=phases, notes=report.notes))
+
+def bench_replay(mine_map, seed):
+    """replay.replay of random reveals and flags on a copy of the map, carrying on after the game is lost"""
+    copy = GameMap.from_cells(mine_map.cells.copy())
+    copy.zero_regions = mine_map.zero_regions
+    stats = replay.timed_replay(replay.random_actions(copy, REPLAY_ACTIONS, seed), copy, stop_when_over=False)
+    yield(result('replay', mine_map.width, 1, (stats['seconds'], stats['seconds']), actions=REPLAY_ACTIONS,
+        actions_per_second=stats['actions_per_second']))
+
+def bench_batch_ops(mine_map):
+    """GameState's batch operations on a copy of the map: flag_around and then chord on every
+    revealed number at once, as a bot would, then reveal_all_safe"""
+    copy = GameMap.from_cells(mine_map.cells.copy())
+    copy.zero_regions = mine_map.zero_regions
+    state = GameState(copy)
+    numbers = np.argwhere(copy.revealed[...] & ~copy.explosive[...] & (copy.numbomb[...] > 0))
+    for name, operation in (('flag_around', state.flag_around), ('chord', state.chord)):
+        start = time.perf_counter()
+        operation(numbers[:, 0], numbers[:, 1])
+        seconds = time.perf_counter()-start
+        yield(result(name, mine_map.width, 1, (seconds, seconds), tiles=len(numbers)))
+    yield(result('reveal_all_safe', mine_map.width, 1, timed(state.reveal_all_safe, 1)))
+
+def bench_server(size, seed):
+    """server.load_test against a GameServer in this process, its games played over local TCP"""
+    stats = asyncio.run(server.run_load_test(None, games=SERVER_GAMES, actions=SERVER_ACTIONS, size=size, seed=seed))
+    seconds = stats.pop('seconds')
+    yield(result('server_load', size, 1, (seconds, seconds), **stats))
+
+def bench_analysis(mine_map, repeat):
+    """analysis.analyze on the finished map, labeling its safe regions (the blank ones come from its index)"""
+    yield(result('analyze', mine_map.width, repeat, timed(lambda: analysis.analyze(mine_map), repeat)))
+
+def bench_render(mine_map, seed, repeat):
+    """GameMap.render into an offscreen console: full redraws with none of the map revealed and
+    all of it, a redraw after a single tile changed, and a frame where nothing changed. The map
+    is left revealed as it was found"""
+    found = mine_map.revealed[...]
+    console = tcod.console.Console(mine_map.width, mine_map.height, order='F')
+    def redraw(x0=0, y0=0, x1=None, y1=None):
+        mine_map.mark_dirty(x0, y0, x1, y1)
+        mine_map.render(console)
+    for name, revealed in (('render_hidden', False), ('render_revealed', True)):
+        mine_map.revealed[:] = revealed
+        yield(result(name, mine_map.width, repeat, timed(redraw, repeat)))
+    x, y = np.random.default_rng(seed).integers(0, (mine_map.width, mine_map.height))
+    yield(result('render_one_tile', mine_map.width, repeat, timed(lambda: redraw(x, y, x+1, y+1), repeat)))
+    yield(result('render_unchanged', mine_map.width, repeat, timed(lambda: mine_map.render(console), repeat)))
+    if mine_map.width > VIEW_SIZE:
+        camera = Camera(VIEW_SIZE, VIEW_SIZE, mine_map.width, mine_map.height)
+        view_console = tcod.console.Console(camera.width, camera.height, order='F')
+        def pan():
+            camera.move(1 if camera.x == 0 else -1, 0)
+            mine_map.render(view_console, camera)
+        yield(result('render_camera_pan', mine_map.width, repeat, timed(pan, repeat), view=VIEW_SIZE))
+    mine_map.revealed[...] = found
+    mine_map.mark_dirty()
+
+def bench_chunked(size, seed):
+    """Time to the first frame of a ChunkedGameMap: opening a start in the middle and drawing the
+    camera view around it, which should not depend on the size of the map"""
+    def run():
+        mine_map = ChunkedGameMap(size, size, 25, seed=seed)
+        camera = Camera(VIEW_SIZE, VIEW_SIZE, size, size)
+        camera.center_on(size//2, size//2)
+        mine_map.reveal_start(size//2, size//2)
+        mine_map.render(tcod.console.Console(camera.width, camera.height, order='F'), camera)
+        return(mine_map)
+    start = time.perf_counter()
+    mine_map = run()
+    seconds = time.perf_counter()-start
+    yield(result('chunked_first_frame', size, 1, (seconds, seconds), view=VIEW_SIZE,
+        chunks_loaded=len(mine_map.cells.loaded)))
+
+def bench_save_load(mine_map, repeat):
+    """Writing a map with map_cache.save_map and opening it again memory-mapped"""
+    directory = tempfile.mkdtemp()
+    path = f'{directory}/map'
+    try:
+        yield(result('save_map', mine_map.width, repeat, timed(lambda: save_map(mine_map, path), repeat)))
+        yield(result('load_map', mine_map.width, repeat, timed(lambda: load_map(path), repeat)))
+    finally: shutil.rmtree(directory)
+
+def bench_export(mine_map, generator, repeat):
+    """export.export_map of the whole map to each image format, and a batch of seeded maps
+    generated and exported through a process pool"""
+    directory = tempfile.mkdtemp()
+    try:
+        for image_format in sorted(export.WRITERS):
+            path = f'{directory}/map.{image_format}'
+            times = timed(lambda: export.export_map(mine_map, path), repeat)
+            yield(result(f'export_{image_format}', mine_map.width, repeat, times, bytes=os.path.getsize(path)))
+        if mine_map.width in EXPORT_BATCH_SIZES:
+            params = {'map_width': mine_map.width, 'map_height': mine_map.height, 'desired_bomb_percent': 25, 'playable': True,
+                'generator': generator}
+            stats = export.export_batch(list(range(EXPORT_BATCH)), params, directory)
+            yield(result('export_batch', mine_map.width, 1, (stats['seconds'], stats['seconds']), maps=stats['maps'],
+                maps_per_minute=stats['maps_per_minute'], generator=generator))
+    finally: shutil.rmtree(directory)
+
+def run_size(size, seed, generator, repeat, workers):
+    yield from bench_generate(size, seed, generator, repeat)
+    yield from bench_parallel(size, seed, workers, repeat)
+    mine_map = procgen.generate_map(size, size, 25, True, generator=generator, seed=seed)
+    yield from bench_fill_gaps(procgen.generate_map(size, size, 25, False, generator=generator, seed=seed).explosive, seed, repeat)
+    yield from bench_reveal(mine_map, seed, clicks=20)
+    yield from bench_flag_toggle(mine_map, seed, toggles=10000)
+    yield from bench_game_state(mine_map, repeat)
+    yield from bench_replay(mine_map, seed)
+    yield from bench_analysis(mine_map, repeat)
+    yield from bench_batch_ops(mine_map)
+    yield from bench_render(mine_map, seed, repeat)
+    if size in SOLVER_SIZES: yield from bench_solver(size, seed, generator)
+    if size in NO_GUESS_SIZES: yield from bench_no_guess(size, seed, generator)
+    if size in SERVER_SIZES: yield from bench_server(size, seed)
+    yield from bench_chunked(size, seed)
+    yield from bench_save_load(mine_map, repeat)
+    yield from bench_export(mine_map, generator, repeat)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 2000, 5000],
+        help='map side lengths to benchmark')
+    parser.add_argument('--generator', default='batched', choices=['tendril', 'batched', 'parallel', 'noise'],
+        help='seeding engine for generate_map (tendril takes minutes past 1000 squares)')
+    parser.add_argument('--workers', type=int, nargs='*', default=sorted({1, os.cpu_count() or 1}),
+        help='process pool sizes to time the parallel generator with')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per timing, the median is reported')
+    parser.add_argument('--output', help='also write the results to this file')
+    args = parser.parse_args(argv)
+    out = open(args.output, 'w') if args.output else None
+    def runs():
+        yield from bench_import(args.repeat)
+        for size in args.sizes:
+            repeat = args.repeat if size <= 500 else 1
+            yield from run_size(size, args.seed, args.generator, repeat, args.workers)
+    for entry in runs():
+        line = json.dumps(entry)
+        print(line, flush=True)
+        if out: out.write(line+'\n')
+    if out: out.close()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
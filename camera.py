@@ -0,0 +1,30 @@
+from typing import Optional, Tuple
+
+class Camera:
+    """The part of the map shown on the console, as the map position of its top left tile and its
+    size in tiles. It is kept inside the map, and is only smaller than the console when the map is"""
+    def __init__(self, width: int, height: int, map_width: int, map_height: int, x: int = 0, y: int = 0):
+        self.width, self.height = min(width, map_width), min(height, map_height)
+        self.map_width, self.map_height = map_width, map_height
+        self.x, self.y = 0, 0
+        self.move(x, y)
+
+    def move(self, dx: int, dy: int) -> None:
+        """Pan by a number of tiles, stopping at the edges of the map"""
+        self.x = max(0, min(self.x+dx, self.map_width-self.width))
+        self.y = max(0, min(self.y+dy, self.map_height-self.height))
+
+    def center_on(self, x: int, y: int) -> None:
+        """Pan so the map tile (x, y) is in the middle of the view, or as near as the edges allow"""
+        self.move(int(x)-self.width//2-self.x, int(y)-self.height//2-self.y)
+
+    @property
+    def view(self) -> Tuple[int, int, int, int]:
+        """The shown map tiles as (x0, y0, x1, y1), ends exclusive"""
+        return((self.x, self.y, self.x+self.width, self.y+self.height))
+
+    def to_map(self, tile: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Return the map tile under a console tile, or None if the console tile is outside the view"""
+        x, y = int(tile[0]), int(tile[1])
+        if not (0 <= x < self.width and 0 <= y < self.height): return(None)
+        return((x+self.x, y+self.y))
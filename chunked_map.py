@@ -0,0 +1,275 @@
+"""A GameMap split into square chunks that are only generated when something first looks at them.
+
+Each chunk's layout comes from its own seed, made from the map's seed and the chunk's position,
+so any chunk can be generated on its own and always comes out the same. Bomb counts along a
+chunk's edges are resolved against the layouts of the chunks around it, so numbomb is right
+across chunk borders. Chunks that have been played on are written to disk when they fall out of
+the in-memory cache and read back when needed again; untouched chunks are simply dropped and
+generated again, so memory stays bounded however large the map is."""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+import os
+import tempfile
+
+import numpy as np
+
+import procgen
+import tile_types
+from game_map import GameMap
+from neighbors import circ_coords, count_adjacent_padded
+from profiling import GenerationReport
+
+# Margins grown around each chunk and cropped off again, as PARALLEL_HALO and PARALLEL_LEAD are
+# for the parallel generator's blocks
+CHUNK_HALO = 32
+CHUNK_LEAD = 128
+
+class ChunkedCells:
+    """The cells of a ChunkedGameMap, indexed like a (width, height) uint8 array: by a pair of ints,
+    a pair of coordinate arrays, a pair of step 1 slices, or ... for everything. Chunks are
+    generated, loaded and evicted behind the scenes as they are touched"""
+    def __init__(self, width: int, height: int, desired_bomb_percent: int, seed: int, chunk_size: int = 128,
+        max_loaded: int = 256, cache_dir: Optional[str] = None, report: Optional[GenerationReport] = None):
+        self.width, self.height = width, height
+        self.desired_bomb_percent, self.seed, self.chunk_size = desired_bomb_percent, seed, chunk_size
+        self.chunks_x, self.chunks_y = -(-width//chunk_size), -(-height//chunk_size)
+        self.max_loaded = max_loaded
+        self.report = report or GenerationReport()
+        # Cells of resolved chunks, least recently used first, and the explosive layouts behind them
+        self.loaded: OrderedDict[Tuple[int, int], np.ndarray] = OrderedDict()
+        self.layouts: OrderedDict[Tuple[int, int], np.ndarray] = OrderedDict()
+        # Chunks with revealed or flagged tiles, which are saved rather than dropped when evicted
+        self.modified = set()
+        self.saved = set()
+        self.cache_dir, self.temp_dir = cache_dir, None
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return((self.width, self.height))
+
+    def chunk_bounds(self, cx: int, cy: int) -> Tuple[int, int, int, int]:
+        """The map tiles covered by a chunk as (x0, y0, x1, y1), ends exclusive"""
+        size = self.chunk_size
+        return((cx*size, cy*size, min((cx+1)*size, self.width), min((cy+1)*size, self.height)))
+
+    def layout(self, cx: int, cy: int) -> np.ndarray:
+        """Return whether each tile of a chunk is a bomb. A chunk_size square is always grown and
+        cropped, so chunks on the map's far edges match what a bigger map would have there"""
+        key = (cx, cy)
+        if key in self.layouts:
+            self.layouts.move_to_end(key)
+            return(self.layouts[key])
+        with self.report.phase('chunk layout'):
+            # Grown and filled with a margin that is cropped off, like a parallel generator block,
+            # so neither the seeds nor the fill leave their edge effects along the chunk borders
+            expl = procgen.grow_block((self.chunk_size, CHUNK_HALO, CHUNK_LEAD, self.desired_bomb_percent, True,
+                procgen.position_seed(self.seed, cx, cy)))
+            x0, y0, x1, y1 = self.chunk_bounds(cx, cy)
+            expl = np.asfortranarray(expl[:x1-x0, :y1-y0])
+        self.layouts[key] = expl
+        if len(self.layouts) > 2*self.max_loaded: self.layouts.popitem(last=False)
+        return(expl)
+
+    def resolve(self, cx: int, cy: int) -> np.ndarray:
+        """Return a fresh chunk's cells, counting bombs over a one tile border taken from the
+        layouts of the chunks around it. Past the edges of the map counts as safe"""
+        x0, y0, x1, y1 = self.chunk_bounds(cx, cy)
+        width, height = x1-x0, y1-y0
+        padded = np.zeros((width+2, height+2), dtype=bool, order='F')
+        padded[1:-1, 1:-1] = self.layout(cx, cy)
+        for dx, dy in circ_coords:
+            nx, ny = cx+dx, cy+dy
+            if not (0 <= nx < self.chunks_x and 0 <= ny < self.chunks_y): continue
+            other = self.layout(nx, ny)
+            # The strip of the other chunk touching this one, and where it goes in the border
+            src_x = slice(-1, None) if dx < 0 else slice(0, 1) if dx > 0 else slice(None)
+            src_y = slice(-1, None) if dy < 0 else slice(0, 1) if dy > 0 else slice(None)
+            dst_x = slice(0, 1) if dx < 0 else slice(-1, None) if dx > 0 else slice(1, -1)
+            dst_y = slice(0, 1) if dy < 0 else slice(-1, None) if dy > 0 else slice(1, -1)
+            padded[dst_x, dst_y] = other[src_x, src_y]
+        with self.report.phase('chunk resolve'):
+            numbomb = count_adjacent_padded(padded)
+            expl = padded[1:-1, 1:-1]
+            return(np.asfortranarray(np.where(expl, tile_types.EXPLOSIVE, 0).astype(np.uint8) | numbomb))
+
+    def chunk(self, cx: int, cy: int) -> np.ndarray:
+        """Return a chunk's cells, loading it from disk or generating it if it is not in memory"""
+        key = (cx, cy)
+        if key in self.loaded:
+            self.loaded.move_to_end(key)
+            return(self.loaded[key])
+        if key in self.saved:
+            with self.report.phase('chunk load'):
+                cells = np.load(self.chunk_path(key))
+        else: cells = self.resolve(cx, cy)
+        self.loaded[key] = cells
+        while len(self.loaded) > self.max_loaded: self.evict()
+        return(cells)
+
+    def evict(self) -> None:
+        """Drop the least recently used chunk, writing it out first if it has been played on"""
+        key, cells = self.loaded.popitem(last=False)
+        if key not in self.modified: return
+        with self.report.phase('chunk evict'):
+            np.save(self.chunk_path(key), cells)
+        self.saved.add(key)
+        self.modified.discard(key)
+
+    def chunk_path(self, key: Tuple[int, int]) -> str:
+        if self.cache_dir is None:
+            self.temp_dir = tempfile.TemporaryDirectory(prefix='chunks-')
+            self.cache_dir = self.temp_dir.name
+        return(os.path.join(self.cache_dir, f'chunk_{key[0]}_{key[1]}.npy'))
+
+    def rect_parts(self, x0: int, y0: int, x1: int, y1: int) -> Iterator[Tuple[Tuple[int, int], tuple, tuple]]:
+        """Yield each chunk overlapping a rectangle of tiles with the rectangle's slices inside the
+        chunk and inside the rectangle"""
+        size = self.chunk_size
+        for cy in range(y0//size, -(-y1//size)):
+            for cx in range(x0//size, -(-x1//size)):
+                bx0, by0, bx1, by1 = self.chunk_bounds(cx, cy)
+                ox0, oy0, ox1, oy1 = max(x0, bx0), max(y0, by0), min(x1, bx1), min(y1, by1)
+                yield((cx, cy), (slice(ox0-bx0, ox1-bx0), slice(oy0-by0, oy1-by0)),
+                    (slice(ox0-x0, ox1-x0), slice(oy0-y0, oy1-y0)))
+
+    def point_groups(self, xs: np.ndarray, ys: np.ndarray) -> Iterator[Tuple[Tuple[int, int], np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield each chunk holding some of the given tiles with the positions of those tiles in xs
+        and their coordinates inside the chunk"""
+        size = self.chunk_size
+        cxs, cys = xs//size, ys//size
+        ids = cxs.astype(np.int64)+cys.astype(np.int64)*self.chunks_x
+        if not len(ids): return
+        if (ids == ids[0]).all():
+            groups = [np.arange(len(ids))]
+        else:
+            order = np.argsort(ids, kind='stable')
+            groups = np.split(order, np.flatnonzero(np.diff(ids[order]))+1)
+        for where in groups:
+            cx, cy = int(cxs[where[0]]), int(cys[where[0]])
+            yield((cx, cy), where, xs[where]-cx*size, ys[where]-cy*size)
+
+    def split_key(self, key):
+        """Return ('rect', bounds) for slice keys or ('points', xs, ys, scalar) for coordinate keys"""
+        if key is Ellipsis: key = (slice(None), slice(None))
+        kx, ky = key
+        if isinstance(kx, slice) and isinstance(ky, slice):
+            (x0, x1, sx), (y0, y1, sy) = kx.indices(self.width), ky.indices(self.height)
+            if sx != 1 or sy != 1: raise IndexError('Chunked cells only take slices with a step of 1')
+            return(('rect', (x0, y0, max(x0, x1), max(y0, y1))))
+        xs, ys = np.broadcast_arrays(np.asarray(kx, dtype=np.int64), np.asarray(ky, dtype=np.int64))
+        if ((xs < 0) | (xs >= self.width) | (ys < 0) | (ys >= self.height)).any():
+            raise IndexError('Tile outside the map')
+        return(('points', xs.ravel(), ys.ravel(), xs.shape))
+
+    def __getitem__(self, key) -> np.ndarray:
+        kind, *rest = self.split_key(key)
+        if kind == 'rect':
+            x0, y0, x1, y1 = rest[0]
+            out = np.empty((x1-x0, y1-y0), dtype=np.uint8, order='F')
+            for chunk_key, inside, into in self.rect_parts(x0, y0, x1, y1):
+                out[into] = self.chunk(*chunk_key)[inside]
+            return(out)
+        xs, ys, shape = rest
+        out = np.empty(len(xs), dtype=np.uint8)
+        for chunk_key, where, lx, ly in self.point_groups(xs, ys):
+            out[where] = self.chunk(*chunk_key)[lx, ly]
+        return(out.reshape(shape)[()])
+
+    def __setitem__(self, key, value) -> None:
+        kind, *rest = self.split_key(key)
+        value = np.asarray(value, dtype=np.uint8)
+        if kind == 'rect':
+            x0, y0, x1, y1 = rest[0]
+            value = np.broadcast_to(value, (x1-x0, y1-y0))
+            for chunk_key, inside, into in self.rect_parts(x0, y0, x1, y1):
+                self.chunk(*chunk_key)[inside] = value[into]
+                self.modified.add(chunk_key)
+            return
+        xs, ys, shape = rest
+        value = np.broadcast_to(value, shape).ravel()
+        for chunk_key, where, lx, ly in self.point_groups(xs, ys):
+            self.chunk(*chunk_key)[lx, ly] = value[where]
+            self.modified.add(chunk_key)
+
+class ChunkFlood:
+    """Stands in for a regions.ZeroRegionIndex on a ChunkedGameMap, so pop_clears floods across
+    chunks. Chunks are only loaded as the flood reaches them, and a flood stops after budget tiles,
+    leaving the rest of a huge region to be opened by clicking its revealed edge again"""
+    def __init__(self, budget: int = 1 << 18):
+        self.budget = budget
+        # Whether the last reveal ran out of budget
+        self.truncated = False
+
+    def reveal(self, tile_address, mine_map) -> Tuple[int, Optional[Tuple[int, int, int, int]]]:
+        """Reveal the blank region connected to tile_address and its numbered border, returning
+        how many tiles were newly revealed and the rectangle they are in"""
+        cells = mine_map.cells
+        width, height = mine_map.width, mine_map.height
+        dx, dy = np.array(circ_coords).T
+        # Tiles reached so far, one mask per chunk the flood has been through
+        visited: Dict[Tuple[int, int], np.ndarray] = {}
+        def first_visits(xs, ys):
+            fresh = np.zeros(len(xs), dtype=bool)
+            for key, where, lx, ly in cells.point_groups(xs, ys):
+                if key not in visited:
+                    x0, y0, x1, y1 = cells.chunk_bounds(*key)
+                    visited[key] = np.zeros((x1-x0, y1-y0), dtype=bool, order='F')
+                fresh[where] = ~visited[key][lx, ly]
+                visited[key][lx, ly] = True
+            return(fresh)
+        xs, ys = np.array([int(tile_address[0])]), np.array([int(tile_address[1])])
+        first_visits(xs, ys)
+        reached_x, reached_y = [xs], [ys]
+        count = 1
+        self.truncated = False
+        while len(xs):
+            if count >= self.budget:
+                self.truncated = True
+                break
+            nx, ny = (xs[:, None]+dx).ravel(), (ys[:, None]+dy).ravel()
+            fits = (nx >= 0) & (ny >= 0) & (nx < width) & (ny < height)
+            nx, ny = nx[fits], ny[fits]
+            _, first = np.unique(nx.astype(np.int64)+ny.astype(np.int64)*width, return_index=True)
+            nx, ny = nx[first], ny[first]
+            fresh = first_visits(nx, ny)
+            nx, ny = nx[fresh], ny[fresh]
+            reached_x.append(nx)
+            reached_y.append(ny)
+            count += len(nx)
+            # Only blank tiles keep spreading, numbered ones are the border of the region
+            blank = mine_map.blank((nx, ny))
+            xs, ys = nx[blank], ny[blank]
+        xs, ys = np.concatenate(reached_x), np.concatenate(reached_y)
+        unflagged = ~mine_map.flagged[xs, ys]
+        xs, ys = xs[unflagged], ys[unflagged]
+        newly = int(np.count_nonzero(~mine_map.revealed[xs, ys]))
+        if not newly: return(0, None)
+        mine_map.revealed[xs, ys] = True
+        changed = (int(xs.min()), int(ys.min()), int(xs.max())+1, int(ys.max())+1)
+        mine_map.mark_dirty(*changed)
+        return(newly, changed)
+
+class ChunkedGameMap(GameMap):
+    """A GameMap whose cells are ChunkedCells, drawn and played on through the same fields, render
+    and pop_clears as a dense map. Nothing is generated until it is looked at or revealed, so the
+    cost of making one does not depend on its size. seed may be anything procgen.make_rng takes"""
+    def __init__(self, width: int, height: int, desired_bomb_percent: int = 25, seed = None,
+        chunk_size: int = 128, max_loaded: int = 256, cache_dir: Optional[str] = None, flood_budget: int = 1 << 18):
+        report = GenerationReport()
+        cells = ChunkedCells(width, height, desired_bomb_percent, procgen.make_rng(seed).getrandbits(63),
+            chunk_size, max_loaded, cache_dir, report)
+        super().__init__(width, height, cells=cells)
+        self.report = report
+        self.zero_regions = ChunkFlood(flood_budget)
+
+    def reveal_start(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+        """Open the blank tile nearest (x, y) within its chunk, returning it, or None if the chunk has none"""
+        cx, cy = x//self.cells.chunk_size, y//self.cells.chunk_size
+        x0, y0, x1, y1 = self.cells.chunk_bounds(cx, cy)
+        blank = np.argwhere(self.blank((slice(x0, x1), slice(y0, y1)))) + (x0, y0)
+        if not len(blank): return(None)
+        tile = blank[np.abs(blank-(x, y)).sum(axis=1).argmin()]
+        procgen.pop_clears(tile, self)
+        return((int(tile[0]), int(tile[1])))
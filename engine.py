@@ -1,23 +1,120 @@
-from typing import Iterable, Any
+from __future__ import annotations
 
+from typing import TYPE_CHECKING, Iterable, Any, Optional, Tuple
+import os
+import time
+
+import numpy as np
+import tcod.event
 from tcod.context import Context
 from tcod.console import Console
 
+from actions import EscapeAction, MovementAction, NewGameAction, RevealAllAction
+from camera import Camera
 from entity import Entity
 from input_handlers import EventHandler
 from game_map import GameMap
+from game_state import GameState
+from replay import ActionLog, apply
+
+if TYPE_CHECKING:
+    from pregen import MapConfig, MapPool
 
 class Engine:
-    def __init__(self, event_handler: EventHandler, game_map: GameMap):
-        self.event_handler, self.game_map = event_handler, game_map
+    def __init__(self, event_handler: EventHandler, game_map: Optional[GameMap] = None, camera: Optional[Camera] = None,
+        view_size: Optional[Tuple[int, int]] = None, map_pool: Optional[MapPool] = None, map_config: Optional[MapConfig] = None,
+        log_dir: Optional[str] = None):
+        """Run a game on game_map, or on maps taken from map_pool for map_config when they are ready.
+        view_size is the size of the cameras made for new maps, the whole map when not given.
+        With log_dir, the tile actions of every game are written to a replay.ActionLog there"""
+        self.event_handler, self.view_size = event_handler, view_size
+        self.map_pool, self.map_config, self.log_dir = map_pool, map_config, log_dir
+        self.action_log: Optional[ActionLog] = None
+        self.game_map: Optional[GameMap] = None
+        self.camera: Optional[Camera] = None
+        self.game_state: Optional[GameState] = None
+        # Set when the window needs the last frame shown again even though no tile changed
+        self.needs_present = True
+        # When the current game was asked for, and how long it took until its map was on screen
+        self.requested = time.perf_counter()
+        self.time_to_first_frame: Optional[float] = None
+        if game_map is not None: self.set_map(game_map, camera)
+
+    def set_map(self, game_map: GameMap, camera: Optional[Camera] = None) -> None:
+        """Start playing on game_map, with a camera centered on its opening reveal unless one is given"""
+        self.game_map = self.event_handler.gamemap = game_map
+        if camera is None:
+            width, height = self.view_size or (game_map.width, game_map.height)
+            camera = Camera(width, height, game_map.width, game_map.height)
+            revealed = np.argwhere(game_map.revealed[:])
+            if len(revealed): camera.center_on(*revealed[len(revealed)//2])
+        self.camera = camera
+        self.game_state = GameState(game_map)
+        self.start_log(game_map)
+        game_map.mark_dirty()
+        self.needs_present = True
+
+    def new_game(self) -> None:
+        """Drop the current game and wait for the next map from the pool"""
+        if self.map_pool is None: return
+        self.start_log(None)
+        self.game_map = self.camera = self.game_state = None
+        self.requested, self.time_to_first_frame = time.perf_counter(), None
+        self.needs_present = True
+
+    def start_log(self, game_map: Optional[GameMap]) -> None:
+        """Close the log of the last game and, if logging, open one for game_map"""
+        if self.action_log is not None: self.action_log.close()
+        self.action_log = None
+        if self.log_dir is None or game_map is None: return
+        os.makedirs(self.log_dir, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{game_map.params.get('seed')}.mslog"
+        self.action_log = ActionLog(os.path.join(self.log_dir, name), game_map.params)
+
+    def play(self, action: int, *tiles: Tuple[int, int]) -> None:
+        """Perform a replay action on map tiles of the current game, logging it if logging"""
+        if self.action_log is not None: self.action_log.append(action, *tiles)
+        apply(self.game_state, action, *tiles)
+
+    @property
+    def game_over(self) -> bool:
+        """Whether the current game has been won or lost"""
+        return(self.game_state is not None and self.game_state.over)
+
+    def update(self) -> None:
+        """Take the next map from the pool if waiting for one and it is ready"""
+        if self.game_map is None and self.map_pool is not None and self.map_pool.ready(self.map_config):
+            self.set_map(self.map_pool.take(self.map_config))
 
     def handle_events(self, events: Iterable[Any]) -> None:
         for event in events:
+            if isinstance(event, tcod.event.WindowEvent): self.needs_present = True
             action = self.event_handler.dispatch(event)
             if action is None: continue
+            # Nothing but quitting works until there is a map to play on, and once the game is over
+            # nothing but quitting, showing the rest of the map, panning around it or starting another
+            if self.game_map is None and not isinstance(action, EscapeAction): continue
+            if self.game_over and not isinstance(action, (EscapeAction, NewGameAction, RevealAllAction, MovementAction)): continue
+            over = self.game_over
             action.perform(self)
+            if self.game_over != over: self.needs_present = True
 
-    def render(self, console: Console, context: Context):
-        self.game_map.render(console)
-        context.present(console)
-        console.clear()
\ No newline at end of file
+    def render(self, console: Console, context: Context) -> None:
+        """Draw the tiles that changed and present the frame. The console is not cleared between
+        frames, so when nothing changed and the window needs no redraw the frame is skipped.
+        While waiting for a map the pool's progress is shown instead, and once the game is over
+        its result is written over the top of the map. The time until a game's first frame goes in
+        its map's report, with the time its generation took"""
+        if self.game_map is None:
+            console.clear()
+            if self.map_pool is not None: console.print(1, 1, self.map_pool.progress_text(self.map_config))
+            context.present(console)
+            return
+        if self.game_map.render(console, self.camera) or self.needs_present:
+            if self.game_over: console.print(1, 1, self.game_state.message(), fg=(255, 255, 255), bg=(0, 0, 0))
+            context.present(console)
+            self.needs_present = False
+            if self.time_to_first_frame is None:
+                self.time_to_first_frame = time.perf_counter()-self.requested
+                report = self.game_map.report
+                if report is not None: report.metrics['time_to_first_frame'] = self.time_to_first_frame
@@ -0,0 +1,159 @@
+"""Writing maps to PNG or PPM images without a window, one pixel (or a square of them) per tile.
+
+Images are streamed a band of EXPORT_BAND map rows at a time: each band's cell bytes are looked
+up in a colour table, scaled and written out (for PNG, through one zlib stream split into IDAT
+chunks), so apart from the map itself memory stays a few bands no matter how large it is. A
+map saved with map_cache is memory-mapped, and then even the map is only read a band at a time.
+
+There are two colour tables: 'board' draws what a player sees, from the glyph colours in
+tile_types, and 'landscape' draws every tile as if revealed, bombs as water and safe tiles
+darkening with their number. Run `python export.py OUT` to generate a map and export it, with
+--map to export a saved one instead, or with --count to export that many seeded maps into the
+directory OUT through a process pool, printing the maps per minute."""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional
+import argparse
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+import procgen
+import tile_types
+from game_map import GameMap
+from map_cache import load_map
+
+# Map rows turned into pixels at a time
+EXPORT_BAND = 256
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_LEVEL = 6
+# Compressed bytes gathered before they are written as an IDAT chunk
+PNG_CHUNK = 1 << 20
+# Tiles whose glyph is drawn take this share of its colour, the rest coming from the background
+GLYPH_WEIGHT = 0.4
+WATER = (40, 70, 130)
+DEEP_SAND = (90, 70, 30)
+
+def board_colors() -> np.ndarray:
+    """The colour of every cell byte as the game draws it, as (256, 3) uint8"""
+    graphics = tile_types.CELL_GRAPHICS
+    fg, bg = graphics['fg'].astype(np.float32), graphics['bg'].astype(np.float32)
+    drawn = ~np.isin(graphics['ch'], (ord(' '), ord('-')))
+    return(np.where(drawn[:, None], bg+(fg-bg)*GLYPH_WEIGHT, bg).round().astype(np.uint8))
+
+def landscape_colors() -> np.ndarray:
+    """The colour of every cell byte with the whole map revealed, as (256, 3) uint8"""
+    cells = np.arange(256)
+    share = ((cells & tile_types.NUMBOMB)/8)[:, None]
+    sand = tile_types.SAFE_LIGHT['bg'].astype(np.float32)
+    colors = sand+(np.array(DEEP_SAND)-sand)*share
+    colors[(cells & tile_types.EXPLOSIVE) != 0] = WATER
+    return(colors.round().astype(np.uint8))
+
+STYLES = {'board': board_colors, 'landscape': landscape_colors}
+
+def pixel_rows(mine_map: GameMap, style: str = 'landscape', scale: int = 1) -> Iterator[np.ndarray]:
+    """The image a band at a time, each (rows, width*scale, 3) uint8 in image order"""
+    colors = STYLES[style]()
+    for y in range(0, mine_map.height, EXPORT_BAND):
+        # Map arrays are (x, y), images are rows of y
+        band = colors[np.asarray(mine_map.cells[:, y:y+EXPORT_BAND]).T]
+        if scale > 1: band = band.repeat(scale, axis=0).repeat(scale, axis=1)
+        yield(band)
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return(struct.pack('>I', len(data))+kind+data+struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+def write_png(file: BinaryIO, width: int, height: int, bands: Iterator[np.ndarray]) -> None:
+    """Write an 8 bit RGB PNG from bands of pixel rows, unfiltered and deflated as it goes"""
+    file.write(PNG_SIGNATURE+png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+    compressor, pending = zlib.compressobj(PNG_LEVEL), []
+    def flush(data, final=False):
+        pending.append(data)
+        if final or sum(map(len, pending)) >= PNG_CHUNK:
+            file.write(png_chunk(b'IDAT', b''.join(pending)))
+            pending.clear()
+    for band in bands:
+        # Every row starts with its filter type, 0 for none
+        rows = np.zeros((len(band), 1+width*3), dtype=np.uint8)
+        rows[:, 1:] = band.reshape(len(band), -1)
+        flush(compressor.compress(rows.tobytes()))
+    flush(compressor.flush(), final=True)
+    file.write(png_chunk(b'IEND', b''))
+
+def write_ppm(file: BinaryIO, width: int, height: int, bands: Iterator[np.ndarray]) -> None:
+    """Write a binary PPM, which is just a header and the raw pixel rows"""
+    file.write(b'P6\n%d %d\n255\n' % (width, height))
+    for band in bands: file.write(np.ascontiguousarray(band).tobytes())
+
+WRITERS = {'png': write_png, 'ppm': write_ppm}
+
+def export_map(mine_map: GameMap, path: str, style: str = 'landscape', scale: int = 1, image_format: Optional[str] = None) -> None:
+    """Write mine_map to an image at path, in image_format or the one its extension names"""
+    image_format = image_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if image_format not in WRITERS: raise ValueError(f'Unknown image format {image_format!r}, use one of {sorted(WRITERS)}')
+    if style not in STYLES: raise ValueError(f'Unknown style {style!r}, use one of {sorted(STYLES)}')
+    with open(path, 'wb') as file:
+        WRITERS[image_format](file, mine_map.width*scale, mine_map.height*scale, pixel_rows(mine_map, style, scale))
+
+def export_seed(args) -> str:
+    """Generate one seeded map and export it, in a worker process"""
+    seed, params, directory, style, scale, image_format = args
+    path = os.path.join(directory, f'map_{seed}.{image_format}')
+    mine_map = procgen.generate_map(**params, seed=seed, region_index=False)
+    export_map(mine_map, path, style, scale, image_format)
+    return(path)
+
+def export_batch(seeds: List[int], params: dict, directory: str, style: str = 'landscape', scale: int = 1,
+        image_format: str = 'png', workers: Optional[int] = None) -> dict:
+    """Generate and export a map per seed into directory across a pool of worker processes,
+    returning the paths written and the throughput"""
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    # Spawned like the other pools, and the core they import does not load tcod
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        paths = list(pool.map(export_seed, [(seed, params, directory, style, scale, image_format) for seed in seeds]))
+    seconds = time.perf_counter()-start
+    return({'maps': len(paths), 'seconds': seconds, 'maps_per_minute': len(paths)*60/seconds, 'paths': paths})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help='image to write, or the directory for --count')
+    parser.add_argument('--map', help='export this map saved by map_cache rather than generating one')
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--height', type=int, default=1000)
+    parser.add_argument('--percent', type=int, default=25, help='desired bomb percent')
+    parser.add_argument('--generator', default='batched', choices=['tendril', 'batched', 'parallel', 'noise'])
+    parser.add_argument('--unplayable', action='store_true', help='generate maps without the playable passes')
+    parser.add_argument('--seed', type=int, help='map seed, the first of them with --count')
+    parser.add_argument('--style', default='landscape', choices=sorted(STYLES))
+    parser.add_argument('--scale', type=int, default=1, help='pixels per tile side')
+    parser.add_argument('--format', choices=sorted(WRITERS), help='image format, by default from the extension or png with --count')
+    parser.add_argument('--count', type=int, help='export this many maps, seeded one after another')
+    parser.add_argument('--workers', type=int, help='processes for --count')
+    args = parser.parse_args(argv)
+    params = {'map_width': args.width, 'map_height': args.height, 'desired_bomb_percent': args.percent,
+        'playable': not args.unplayable, 'generator': args.generator}
+    if args.count:
+        first = args.seed if args.seed is not None else int(time.time())
+        stats = export_batch(list(range(first, first+args.count)), params, args.output, args.style,
+            args.scale, args.format or 'png', args.workers)
+        print(json.dumps({key: value for key, value in stats.items() if key != 'paths'}), flush=True)
+        return
+    start = time.perf_counter()
+    mine_map = load_map(args.map) if args.map else procgen.generate_map(**params, seed=args.seed, region_index=False)
+    made = time.perf_counter()
+    export_map(mine_map, args.output, args.style, args.scale, args.format)
+    done = time.perf_counter()
+    print(json.dumps({'output': args.output, 'width': mine_map.width, 'height': mine_map.height,
+        'map_seconds': made-start, 'export_seconds': done-made}), flush=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
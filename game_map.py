@@ -1,28 +1,114 @@
 from __future__ import annotations
 import numpy as np
-from tcod.console import Console
 
 import tile_types
 
-from typing import Iterable
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
 from entity import Entity
 
+# tcod is only the front end's business, so the map and everything built on it loads without it
+if TYPE_CHECKING:
+    from tcod.console import Console
+    from camera import Camera
+
+# More separate dirty rectangles than this are redrawn as their bounding box instead
+MAX_DIRTY_RECTS = 64
+
+class CellField:
+    """An array-like view of some bits of a GameMap's cells, so a single plane of bytes can be read
+    and written as its separate explosive, revealed, flagged and numbomb arrays. Indexing returns
+    plain arrays (bools for single bit fields, numbers for numbomb) and assigning writes the bits back"""
+    def __init__(self, cells: np.ndarray, mask: int):
+        self.cells, self.mask = cells, np.uint8(mask)
+        self.keep = np.uint8(0xFF ^ mask)
+        self.boolean = not mask & (mask-1)
+
+    @property
+    def shape(self):
+        return(self.cells.shape)
+
+    def __getitem__(self, key):
+        bits = self.cells[key] & self.mask
+        return(bits != 0 if self.boolean else bits)
+
+    def __setitem__(self, key, value) -> None:
+        if self.boolean:
+            value = np.asarray(value, dtype=bool)
+            if not value.ndim:
+                if value: self.cells[key] |= self.mask
+                else: self.cells[key] &= self.keep
+                return
+            value = np.where(value, self.mask, np.uint8(0))
+        self.cells[key] = (self.cells[key] & self.keep) | (np.asarray(value, dtype=np.uint8) & self.mask)
+
+    def __ior__(self, other) -> CellField:
+        self.cells[np.asarray(other, dtype=bool)] |= self.mask
+        return(self)
+
+    def __invert__(self) -> np.ndarray:
+        return(~self[...])
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return(self[...] if dtype is None else self[...].astype(dtype))
+
 class GameMap:
-    def __init__(self, width:int, height:int, entities: Iterable[Entity] = ()):
+    def __init__(self, width:int, height:int, entities: Iterable[Entity] = (), cells = None):
+        """Make an all-bomb map, or one over an existing plane of cells, which may be anything indexed
+        like a (width, height) uint8 array such as chunked_map.ChunkedCells"""
         self.width, self.height = width, height
         self.entities = set(entities)
-        self.tiles = np.full((width, height), fill_value=tile_types.bomb, order="F")
-        self.revealed = np.full((width, height), fill_value=False, order='F')
-        self.explosive = np.full((width, height), fill_value=True, order='F')
-
-    def render(self, console: Console) -> None:
-        """If a tile is visible, draw with "light" colors, otherwise draw with SHROUD"""
-        console.tiles_rgb[0:self.width, 0:self.height] = np.select(
-            condlist = [self.revealed],
-            choicelist = [self.tiles['light']],
-            default = tile_types.SHROUD
-        )
+        # One byte per tile, see tile_types for the bits, read and written through the fields below
+        if cells is None: cells = np.full((width, height), fill_value=tile_types.EXPLOSIVE, dtype=np.uint8, order='F')
+        self.cells = cells
+        self.explosive = CellField(self.cells, tile_types.EXPLOSIVE)
+        self.revealed = CellField(self.cells, tile_types.REVEALED)
+        self.flagged = CellField(self.cells, tile_types.FLAGGED)
+        self.numbomb = CellField(self.cells, tile_types.NUMBOMB)
+        # Optional regions.ZeroRegionIndex, built once numbomb values are final
+        self.zero_regions = None
+        # The profiling.GenerationReport of the generate_map call that made this map, and its arguments
+        self.report = None
+        self.params: dict = {}
+        # (x0, y0, x1, y1) rectangles changed since the last render, ends exclusive
+        self.dirty: List[Tuple[int, int, int, int]] = [(0, 0, width, height)]
+        # The view the console was last drawn with, so a camera move redraws all of it
+        self.drawn_view: Optional[Tuple[int, int, int, int]] = None
+
+    @classmethod
+    def from_cells(cls, cells: np.ndarray, entities: Iterable[Entity] = ()) -> GameMap:
+        """Make a map over an existing (width, height) plane of cells, such as a loaded or memory-mapped one"""
+        return(cls(cells.shape[0], cells.shape[1], entities, cells=cells))
+
+    def mark_dirty(self, x0: int = 0, y0: int = 0, x1: Optional[int] = None, y1: Optional[int] = None) -> None:
+        """Note that the tiles in a rectangle changed and need drawing again, the whole map by default.
+        Past MAX_DIRTY_RECTS rectangles they are merged into their bounding box"""
+        self.dirty.append((int(x0), int(y0), self.width if x1 is None else int(x1), self.height if y1 is None else int(y1)))
+        if len(self.dirty) > MAX_DIRTY_RECTS:
+            x0s, y0s, x1s, y1s = zip(*self.dirty)
+            self.dirty = [(min(x0s), min(y0s), max(x1s), max(y1s))]
+
+    def blank(self, key=...) -> np.ndarray:
+        """Return whether the tiles at key are safe with no bombs around them"""
+        return((self.cells[key] & tile_types.BLANK_BITS) == 0)
+
+    def render(self, console: Console, camera: Optional[Camera] = None) -> bool:
+        """Draw each changed tile in the camera's view, the whole map without one, by looking its cell
+        byte up in tile_types.CELL_GRAPHICS: revealed tiles with their "light" graphic, flags as flags,
+        and everything else as SHROUD. The console keeps what was drawn before, so only the parts of
+        dirty rectangles inside the view are redrawn, all of it after the camera moves. Returns
+        whether anything was drawn"""
+        view = camera.view if camera else (0, 0, self.width, self.height)
+        if view != self.drawn_view:
+            self.dirty, self.drawn_view = [view], view
+        vx0, vy0, vx1, vy1 = view
+        drawn = False
+        for x0, y0, x1, y1 in self.dirty:
+            x0, y0, x1, y1 = max(x0, vx0), max(y0, vy0), min(x1, vx1), min(y1, vy1)
+            if x0 >= x1 or y0 >= y1: continue
+            console.rgb[x0-vx0:x1-vx0, y0-vy0:y1-vy0] = tile_types.CELL_GRAPHICS[self.cells[x0:x1, y0:y1]]
+            drawn = True
+        self.dirty = []
         for entity in self.entities:
             pass
             #console.print(entity.x, entity.y, entity.char, fg=entity.color)
-
+        return(drawn)
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+import tile_types
+from neighbors import adjacent_coords
+from procgen import pop_clears, reveal_tiles
+
+PLAYING, WON, LOST = 'playing', 'won', 'lost'
+
+class GameState:
+    """Running counts for one game on a map: safe tiles still hidden, flags placed and flags
+    on bombs. They are counted once from the map's cells, then every reveal and flag action
+    adjusts them, so winning (no safe tile left hidden) or losing is known straight away.
+    Maps whose cells are not a plain array, like the unbounded chunked ones, cannot be counted
+    up front; they keep None for the counts that need it and can only be lost"""
+    def __init__(self, mine_map):
+        self.mine_map = mine_map
+        self.status = PLAYING
+        # The bomb that ended the game, if one did
+        self.exploded: Optional[Tuple[int, int]] = None
+        self.flags = self.correct_flags = 0
+        self.safe_remaining: Optional[int] = None
+        self.mines: Optional[int] = None
+        cells = mine_map.cells
+        if isinstance(cells, np.ndarray):
+            explosive = (cells & tile_types.EXPLOSIVE) != 0
+            flagged = (cells & tile_types.FLAGGED) != 0
+            self.mines = int(np.count_nonzero(explosive))
+            self.safe_remaining = int(np.count_nonzero((cells & (tile_types.EXPLOSIVE | tile_types.REVEALED)) == 0))
+            self.flags = int(np.count_nonzero(flagged))
+            self.correct_flags = int(np.count_nonzero(flagged & explosive))
+
+    @property
+    def over(self) -> bool:
+        return(self.status != PLAYING)
+
+    @property
+    def mines_left(self) -> Optional[int]:
+        """Bombs not yet flagged, going by the flags placed"""
+        return(None if self.mines is None else self.mines-self.flags)
+
+    def reveal(self, tile) -> None:
+        """Reveal a map tile as a click would: a blank one opens its whole region, a numbered one
+        just itself and a bomb ends the game. Flagged tiles are left alone"""
+        mine_map, (x, y) = self.mine_map, tile
+        # The tile's one cell byte says all there is to know about it
+        cell = int(mine_map.cells[x, y])
+        if cell & tile_types.FLAGGED: return
+        if not cell & tile_types.BLANK_BITS:
+            self.on_reveal(pop_clears(tile, mine_map))
+            return
+        if cell & tile_types.REVEALED: return
+        mine_map.cells[x, y] = cell | tile_types.REVEALED
+        mine_map.mark_dirty(x, y, x+1, y+1)
+        if cell & tile_types.EXPLOSIVE: self.on_explode(tile)
+        else: self.on_reveal(1)
+
+    def toggle_flag(self, tile) -> None:
+        """Put a flag on a hidden tile or take it off again. The tile's glyph comes from its cell
+        byte when drawn, so taking a flag back off needs nothing recomputed"""
+        mine_map, (x, y) = self.mine_map, tile
+        cell = int(mine_map.cells[x, y])
+        if cell & tile_types.REVEALED: return
+        mine_map.cells[x, y] = cell ^ tile_types.FLAGGED
+        mine_map.mark_dirty(x, y, x+1, y+1)
+        self.on_flag(tile, not cell & tile_types.FLAGGED)
+
+    def reveal_many(self, xs, ys) -> None:
+        """reveal for arrays of tiles at once, the game ending at the first bomb among them"""
+        newly, bombs = reveal_tiles(xs, ys, self.mine_map)
+        self.on_reveal(newly)
+        if len(bombs): self.on_explode(bombs[0])
+
+    def around_numbers(self, xs, ys):
+        """The revealed numbered tiles among the given ones, and the coordinates, flagged state
+        and owner (index into the numbered tiles) of the hidden tiles around them"""
+        mine_map = self.mine_map
+        xs, ys = np.asarray(xs, dtype=np.int64).ravel(), np.asarray(ys, dtype=np.int64).ravel()
+        cells = np.asarray(mine_map.cells[xs, ys])
+        numbered = ((cells & tile_types.REVEALED) != 0) & ((cells & tile_types.EXPLOSIVE) == 0) & ((cells & tile_types.NUMBOMB) != 0)
+        xs, ys, cells = xs[numbered], ys[numbered], cells[numbered]
+        nx, ny, owner = adjacent_coords(xs, ys, mine_map.width, mine_map.height)
+        around = np.asarray(mine_map.cells[nx, ny])
+        hidden = (around & tile_types.REVEALED) == 0
+        return(cells & tile_types.NUMBOMB, nx[hidden], ny[hidden], (around[hidden] & tile_types.FLAGGED) != 0, owner[hidden])
+
+    def chord(self, xs, ys) -> None:
+        """For each revealed number among the tiles with as many flags around it as its number,
+        reveal the rest of the hidden tiles around it"""
+        numbers, nx, ny, flagged, owner = self.around_numbers(xs, ys)
+        satisfied = np.bincount(owner[flagged], minlength=len(numbers)) == numbers
+        pick = satisfied[owner] & ~flagged
+        self.reveal_many(nx[pick], ny[pick])
+
+    def flag_around(self, xs, ys) -> None:
+        """For each revealed number among the tiles with only as many hidden tiles around it as
+        its number, flag all of them"""
+        numbers, nx, ny, flagged, owner = self.around_numbers(xs, ys)
+        certain = np.bincount(owner, minlength=len(numbers)) == numbers
+        self.set_flags(nx[certain[owner]], ny[certain[owner]], True)
+
+    def reveal_area(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        """Reveal every hidden, unflagged tile in a rectangle, ends exclusive"""
+        x0, x1 = max(min(x0, x1), 0), min(max(x0, x1), self.mine_map.width)
+        y0, y1 = max(min(y0, y1), 0), min(max(y0, y1), self.mine_map.height)
+        cells = np.asarray(self.mine_map.cells[x0:x1, y0:y1])
+        xs, ys = np.nonzero((cells & (tile_types.REVEALED | tile_types.FLAGGED)) == 0)
+        self.reveal_many(xs+x0, ys+y0)
+
+    def set_flags(self, xs, ys, placed: bool) -> None:
+        """Flag, or unflag, every hidden tile among the given ones"""
+        mine_map = self.mine_map
+        xs, ys = np.asarray(xs, dtype=np.int64).ravel(), np.asarray(ys, dtype=np.int64).ravel()
+        if len(xs): xs, ys = np.unique(np.stack([xs, ys], axis=1), axis=0).T
+        cells = np.asarray(mine_map.cells[xs, ys])
+        change = ((cells & tile_types.REVEALED) == 0) & (((cells & tile_types.FLAGGED) != 0) != placed)
+        if not change.any(): return
+        xs, ys, cells = xs[change], ys[change], cells[change]
+        mine_map.cells[xs, ys] = cells ^ tile_types.FLAGGED
+        mine_map.mark_dirty(xs.min(), ys.min(), xs.max()+1, ys.max()+1)
+        sign = 1 if placed else -1
+        self.flags += sign*len(xs)
+        self.correct_flags += sign*int(np.count_nonzero(cells & tile_types.EXPLOSIVE))
+
+    def reveal_all_safe(self) -> None:
+        """Reveal every safe tile on the map, taking any flags off them, as at the end of a game.
+        Only for maps whose cells are a plain array"""
+        cells = self.mine_map.cells
+        if not isinstance(cells, np.ndarray): return
+        safe = (cells & tile_types.EXPLOSIVE) == 0
+        wrong = safe & ((cells & tile_types.FLAGGED) != 0)
+        self.flags -= int(np.count_nonzero(wrong))
+        newly = int(np.count_nonzero(safe & ((cells & tile_types.REVEALED) == 0)))
+        cells[safe] = (cells[safe] | tile_types.REVEALED) & ~np.uint8(tile_types.FLAGGED)
+        self.mine_map.mark_dirty()
+        self.on_reveal(newly)
+
+    def on_reveal(self, newly: int) -> None:
+        """Count newly revealed safe tiles, as returned by pop_clears. The counts carry on after
+        the game is over, only its result stays as it was"""
+        if self.safe_remaining is None: return
+        self.safe_remaining -= newly
+        if self.safe_remaining <= 0 and not self.over: self.status = WON
+
+    def on_flag(self, tile_address, placed: bool) -> None:
+        """Count a flag placed on or taken off a tile"""
+        change = 1 if placed else -1
+        self.flags += change
+        if self.mine_map.explosive[tile_address]: self.correct_flags += change
+
+    def on_explode(self, tile_address) -> None:
+        """End the game on a revealed bomb, unless it is over already"""
+        if self.over: return
+        self.status = LOST
+        self.exploded = (int(tile_address[0]), int(tile_address[1]))
+
+    def message(self) -> str:
+        """One line describing how the game went or is going"""
+        if self.status == WON: return('Cleared! Press N for a new game')
+        if self.status == LOST: return(f'Boom at {self.exploded}. Press N for a new game')
+        if self.safe_remaining is None: return(f'{self.flags} flags')
+        return(f'{self.safe_remaining} safe tiles left, {self.mines_left} mines unflagged')
@@ -1,14 +1,21 @@
-from typing import Optional
+from typing import Optional, Tuple
 
 import tcod.event
 
-from actions import Action, EscapeAction, MovementAction, MouseAction, SpaceAction
+from actions import (Action, AreaRevealAction, ChordAction, EscapeAction, FlagAroundAction, MovementAction,
+    MouseAction, NewGameAction, RevealAllAction, SpaceAction, mouse_tile)
 from game_map import GameMap
 
+# Tiles panned per arrow key press, and with shift held
+PAN_STEP = 1
+FAST_PAN_STEP = 10
+
 class EventHandler(tcod.event.EventDispatch[Action]):
     def __init__(self, gamemap, context):
         self.context = context
         self.gamemap = gamemap
+        # The console tile a shift-drag for an area reveal started on
+        self.drag_start: Optional[Tuple[int, int]] = None
 
     def ev_quit(self, event: tcod.event.Quit) -> Optional[Action]:
         raise SystemExit()
@@ -17,25 +24,48 @@ class EventHandler(tcod.event.EventDispatch[Action]):
         action: Optional[Action] = None
 
         key = event.sym
+        step = FAST_PAN_STEP if event.mod & tcod.event.Modifier.SHIFT else PAN_STEP
 
         if key == tcod.event.K_UP:
-            action = MovementAction(dx=0, dy=-1)
+            action = MovementAction(dx=0, dy=-step)
         elif key == tcod.event.K_DOWN:
-            action = MovementAction(dx=0, dy=1)
+            action = MovementAction(dx=0, dy=step)
         elif key == tcod.event.K_LEFT:
-            action = MovementAction(dx=-1, dy=0)
+            action = MovementAction(dx=-step, dy=0)
         elif key == tcod.event.K_RIGHT:
-            action = MovementAction(dx=1, dy=0)
+            action = MovementAction(dx=step, dy=0)
 
         elif key == tcod.event.K_ESCAPE:
             action = EscapeAction()
 
+        elif key == tcod.event.K_n:
+            action = NewGameAction()
+
         elif key == tcod.event.K_SPACE:
             action = SpaceAction(event, self.context, self.gamemap)
+        elif key == tcod.event.K_c:
+            action = ChordAction(mouse_tile(self.context))
+        elif key == tcod.event.K_f:
+            action = FlagAroundAction(mouse_tile(self.context))
+        elif key == tcod.event.K_v:
+            action = RevealAllAction()
 
         # No valid key was pressed
         return action
 
     def ev_mousebuttondown(self, event: tcod.event.MouseButtonDown) -> Optional[Action]:
+        if event.button == tcod.event.MouseButton.MIDDLE:
+            self.context.convert_event(event)
+            return ChordAction(event.tile)
+        if event.button == tcod.event.MouseButton.LEFT and tcod.event.get_modifier_state() & tcod.event.Modifier.SHIFT:
+            self.context.convert_event(event)
+            self.drag_start = event.tile
+            return None
         action = MouseAction(event, self.context, self.gamemap)
-        return action
\ No newline at end of file
+        return action
+
+    def ev_mousebuttonup(self, event: tcod.event.MouseButtonUp) -> Optional[Action]:
+        if self.drag_start is None or event.button != tcod.event.MouseButton.LEFT: return None
+        self.context.convert_event(event)
+        start, self.drag_start = self.drag_start, None
+        return AreaRevealAction(start, event.tile)
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""Saving generated maps as raw arrays that open instantly, and a size-bounded cache of them.
+
+A saved map is a directory holding cells.npy (the GameMap's one byte per tile plane, see
+tile_types), labels.npy and boxes.npy when the map has a regions.ZeroRegionIndex, and meta.json
+with the size and generation parameters. The arrays are plain uncompressed .npy files, so loading
+memory-maps them: a map of any size opens in milliseconds and its tiles are only read from the
+page cache as they are touched. Cells are mapped copy-on-write, so playing never changes the file."""
+from __future__ import annotations
+
+from typing import Optional
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import procgen
+from game_map import GameMap
+from regions import ZeroRegionIndex
+
+FORMAT_VERSION = 1
+
+def save_map(mine_map: GameMap, path: str, **params) -> None:
+    """Write a map to the directory path, replacing anything there, along with its generation
+    parameters (mine_map.params, updated with any given)"""
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    # Written beside the final place and renamed into it, so a reader never sees half a map
+    staging = tempfile.mkdtemp(prefix='.saving-', dir=parent)
+    try:
+        np.save(os.path.join(staging, 'cells.npy'), np.asfortranarray(mine_map.cells))
+        index = mine_map.zero_regions
+        if isinstance(index, ZeroRegionIndex):
+            np.save(os.path.join(staging, 'labels.npy'), np.asfortranarray(index.labels))
+            np.save(os.path.join(staging, 'boxes.npy'), index.boxes)
+        meta = {'version': FORMAT_VERSION, 'width': mine_map.width, 'height': mine_map.height,
+            'params': {**mine_map.params, **params}}
+        if mine_map.report is not None: meta['report'] = mine_map.report.as_dict()
+        with open(os.path.join(staging, 'meta.json'), 'w') as file: json.dump(meta, file)
+        if os.path.isdir(path): shutil.rmtree(path)
+        os.replace(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+def load_map(path: str, mmap: bool = True) -> GameMap:
+    """Open a map written by save_map. With mmap the arrays are memory-mapped rather than read,
+    the cells copy-on-write so changes stay in this process; without it they are read into memory"""
+    with open(os.path.join(path, 'meta.json')) as file: meta = json.load(file)
+    if meta.get('version') != FORMAT_VERSION: raise ValueError(f"Unsupported map format {meta.get('version')!r} in {path}")
+    mode = 'c' if mmap else None
+    mine_map = GameMap.from_cells(np.load(os.path.join(path, 'cells.npy'), mmap_mode=mode))
+    if os.path.exists(os.path.join(path, 'labels.npy')):
+        mine_map.zero_regions = ZeroRegionIndex(np.load(os.path.join(path, 'labels.npy'), mmap_mode='r' if mmap else None),
+            np.load(os.path.join(path, 'boxes.npy')))
+    mine_map.params = meta['params']
+    return(mine_map)
+
+def map_size(path: str) -> int:
+    """Bytes taken by a saved map"""
+    return(sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file()))
+
+class MapCache:
+    """Generated maps saved under directory, keyed by their size, bomb percent, seed and generation
+    options. get loads a map if it is there and otherwise generates and saves it, and once the
+    saved maps take more than max_bytes the least recently used are deleted"""
+    def __init__(self, directory: str, max_bytes: int = 2 << 30):
+        self.directory, self.max_bytes = directory, max_bytes
+
+    def key_path(self, map_width: int, map_height: int, desired_bomb_percent: int, seed: int,
+        playable: bool = True, generator: str = 'tendril', no_guess: bool = False) -> str:
+        name = f'{map_width}x{map_height}-{desired_bomb_percent}-{seed}-{generator}{"" if playable else "-unplayable"}'
+        if no_guess: name += '-noguess'
+        return(os.path.join(self.directory, name))
+
+    def get(self, map_width: int, map_height: int, desired_bomb_percent: int, seed: Optional[int] = None,
+        playable: bool = True, generator: str = 'tendril', **options) -> GameMap:
+        """Return the map generate_map makes for these arguments, from the cache when possible.
+        Without an int seed the map could never be asked for again, so it is generated and not kept"""
+        if not isinstance(seed, int):
+            return(procgen.generate_map(map_width, map_height, desired_bomb_percent, playable,
+                generator=generator, seed=seed, **options))
+        path = self.key_path(map_width, map_height, desired_bomb_percent, seed, playable, generator, options.get('no_guess', False))
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            # The directory's modification time is its place in the LRU order
+            os.utime(path)
+            return(load_map(path))
+        mine_map = procgen.generate_map(map_width, map_height, desired_bomb_percent, playable,
+            generator=generator, seed=seed, **options)
+        save_map(mine_map, path)
+        self.evict(keep=path)
+        return(mine_map)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Delete the least recently used maps until the cache fits in max_bytes, never deleting keep"""
+        if not os.path.isdir(self.directory): return
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                entries.append((entry.stat().st_mtime, entry.path, map_size(entry.path)))
+        total = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries):
+            if total <= self.max_bytes: break
+            if keep and os.path.samefile(path, keep): continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
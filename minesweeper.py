@@ -1,37 +1,56 @@
+import sys
+
 import tcod
 from input_handlers import EventHandler
 from engine import Engine
-from procgen import generate_map
+from pregen import MapPool
+
+# Maps generated from a seed given on the command line are kept here and reopened next time
+MAP_CACHE_DIR = 'map_cache'
+# Every game's actions are logged here, to be replayed with replay.py
+ACTION_LOG_DIR = 'action_logs'
+# Maps kept generating or ready per configuration, so new games start without waiting
+POOL_SIZE = 2
 
 def main():
-    s_width = 500
-    s_height = 500
+    s_width = 100
+    s_height = 100
     g_width = 500
     g_height = 500
 
-    tileset = tcod.tileset.load_tilesheet("Games/Minesweeper/randomimage.png", 32, 8, tcod.tileset.CHARMAP_TCOD)
     playable = True
-    game_map = generate_map(g_width, g_height, 25, playable)
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    map_config = (g_width, g_height, 25, playable, 'tendril')
+    # Started before the window so the first map is generating while it opens
+    map_pool = MapPool(POOL_SIZE, seed=seed, cache_dir=MAP_CACHE_DIR if seed is not None else None)
+    map_pool.fill(map_config)
+
+    tileset = tcod.tileset.load_tilesheet("Games/Minesweeper/randomimage.png", 32, 8, tcod.tileset.CHARMAP_TCOD)
     context = tcod.context.new(
         x=100,
         y=100,
         width = 1000,
         height = 1000,
-        columns = g_width,
-        rows = g_height,
+        columns = s_width,
+        rows = s_height,
         tileset=tileset,
         title = "Minesweeper",
         vsync=True)
 
-    event_handler = EventHandler(game_map, context)
+    event_handler = EventHandler(None, context)
 
-    engine = Engine(event_handler = event_handler, game_map = game_map)
+    engine = Engine(event_handler = event_handler, view_size = (s_width, s_height), map_pool = map_pool, map_config = map_config,
+        log_dir = ACTION_LOG_DIR)
 
     root_console = tcod.Console(s_width, s_height, order='F')
-    while True:
-        engine.render(console=root_console, context=context)
-        events = tcod.event.wait()
-        engine.handle_events(events)
+    try:
+        while True:
+            engine.update()
+            engine.render(console=root_console, context=context)
+            # Keep the loading screen ticking while there is no map yet
+            events = tcod.event.wait(timeout=None if engine.game_map else 0.1)
+            engine.handle_events(events)
+    finally: map_pool.close()
                 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,62 @@
+import numpy as np
+
+circ_coords = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+def count_adjacent(mask: np.ndarray) -> np.ndarray:
+    """Return, for every tile, how many of its 8 surrounding tiles are set in mask.
+    Tiles past the edge of the map count as unset, matching the old per-tile sums"""
+    width, height = mask.shape
+    padded = np.zeros((width+2, height+2), dtype=np.uint8, order='F')
+    padded[1:-1, 1:-1] = mask
+    return(count_adjacent_padded(padded))
+
+def count_adjacent_padded(padded: np.ndarray) -> np.ndarray:
+    """count_adjacent for a mask that already carries a border of one tile on every side, such as
+    the edges of the chunks around it, returning the counts for the tiles inside the border"""
+    width, height = padded.shape[0]-2, padded.shape[1]-2
+    padded = padded.astype(np.uint8, copy=False)
+    count = np.zeros((width, height), dtype=np.uint8, order='F')
+    for x, y in circ_coords:
+        count += padded[1+x:width+1+x, 1+y:height+1+y]
+    return(count)
+
+def dilate(mask: np.ndarray) -> np.ndarray:
+    """Return mask grown by one tile in all 8 directions"""
+    return(mask | (count_adjacent(mask) > 0))
+
+def dilate_square(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Return mask grown by radius tiles in all 8 directions, so each set tile becomes a
+    (2*radius+1) square, done as two 1-dimensional passes rather than radius dilates"""
+    grown = mask.copy()
+    for axis in (0, 1):
+        source = grown.copy() if radius else grown
+        for step in range(1, radius+1):
+            ahead = [slice(None)]*2
+            behind = [slice(None)]*2
+            ahead[axis], behind[axis] = slice(step, None), slice(None, -step)
+            grown[tuple(ahead)] |= source[tuple(behind)]
+            grown[tuple(behind)] |= source[tuple(ahead)]
+    return(grown)
+
+def min_square(values: np.ndarray, radius: int) -> np.ndarray:
+    """Return, for every tile, the least of values within radius tiles in all 8 directions,
+    done in two 1-dimensional passes like dilate_square"""
+    least = values.copy()
+    for axis in (0, 1):
+        source = least.copy()
+        for step in range(1, radius+1):
+            ahead = [slice(None)]*2
+            behind = [slice(None)]*2
+            ahead[axis], behind[axis] = slice(step, None), slice(None, -step)
+            np.minimum(least[tuple(ahead)], source[tuple(behind)], out=least[tuple(ahead)])
+            np.minimum(least[tuple(behind)], source[tuple(ahead)], out=least[tuple(behind)])
+    return(least)
+
+def adjacent_coords(xs: np.ndarray, ys: np.ndarray, width: int, height: int):
+    """Return the coordinates of the 8 tiles around each given tile that lie on a width by
+    height map, with the index of the given tile each one is around"""
+    dx, dy = np.array(circ_coords).T
+    nx, ny = (np.asarray(xs)[:, None]+dx).ravel(), (np.asarray(ys)[:, None]+dy).ravel()
+    owner = np.repeat(np.arange(len(xs)), len(circ_coords))
+    fits = (nx >= 0) & (ny >= 0) & (nx < width) & (ny < height)
+    return(nx[fits], ny[fits], owner[fits])
@@ -0,0 +1,107 @@
+"""Generating maps in background processes ahead of time, so a new game can start right away.
+
+A MapPool keeps a few maps per configuration (the size, bomb percent, playability and generator
+passed to generate_map) generating or ready at all times. Taking a map starts the next one, so
+while a game is played its successor is being made. Worker processes report each generation
+phase as it finishes, which progress_text() turns into a line of text for a loading screen."""
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, Optional, Tuple
+import multiprocessing
+import os
+import queue
+import time
+
+import procgen
+from game_map import GameMap
+from map_cache import MapCache
+from profiling import GenerationReport
+
+# (map_width, map_height, desired_bomb_percent, playable, generator)
+MapConfig = Tuple[int, int, int, bool, str]
+
+# The queue a worker process sends (job, phase) progress on, set when the worker starts
+progress_queue = None
+
+def init_worker(progress) -> None:
+    global progress_queue
+    progress_queue = progress
+
+def pregenerate(job: int, config: MapConfig, seed: int, cache_dir: Optional[str] = None) -> GameMap:
+    """Make one map in a worker process, reporting each phase as it finishes"""
+    map_width, map_height, desired_bomb_percent, playable, generator = config
+    def sent(name, seconds, peak): progress_queue.put((job, name))
+    report = GenerationReport(callback=sent)
+    if cache_dir is not None:
+        # A cached map comes back memory-mapped, and is pickled whole on its way to the main process
+        mine_map = MapCache(cache_dir).get(map_width, map_height, desired_bomb_percent, seed, playable, generator, report=report)
+    else: mine_map = procgen.generate_map(map_width, map_height, desired_bomb_percent, playable,
+        generator=generator, seed=seed, report=report)
+    # The callback only works in this process and could not be pickled back anyway
+    report.callback = None
+    return(mine_map)
+
+class MapPool:
+    """Keeps size maps per configuration generating or ready in a pool of worker processes,
+    each from a seed drawn from seed, so the maps a pool hands out can be made again. With
+    cache_dir the workers go through a map_cache.MapCache there"""
+    def __init__(self, size: int = 2, workers: Optional[int] = None, seed = None, cache_dir: Optional[str] = None):
+        self.size, self.cache_dir = size, cache_dir
+        self.rng = procgen.make_rng(seed)
+        # Spawned rather than forked, so workers never inherit a window or a running event loop
+        context = multiprocessing.get_context('spawn')
+        self.progress = context.Queue()
+        self.executor = ProcessPoolExecutor(max_workers=workers or max(1, (os.cpu_count() or 1)-1),
+            mp_context=context, initializer=init_worker, initargs=(self.progress,))
+        self.jobs: Dict[MapConfig, Deque[Tuple[int, Future]]] = {}
+        # The last phase each job finished and when it was submitted
+        self.phases: Dict[int, str] = {}
+        self.submitted: Dict[int, float] = {}
+        self.next_job = 0
+
+    def fill(self, config: MapConfig) -> None:
+        """Start generating maps for config until size of them are on the way or ready"""
+        jobs = self.jobs.setdefault(config, deque())
+        while len(jobs) < self.size:
+            job, self.next_job = self.next_job, self.next_job+1
+            seed = self.rng.getrandbits(63)
+            jobs.append((job, self.executor.submit(pregenerate, job, config, seed, self.cache_dir)))
+            self.submitted[job] = time.perf_counter()
+
+    def ready(self, config: MapConfig) -> bool:
+        """Whether a map for config can be taken without waiting"""
+        self.fill(config)
+        return(any(future.done() for _, future in self.jobs[config]))
+
+    def take(self, config: MapConfig, timeout: Optional[float] = None) -> GameMap:
+        """Return the first finished map for config, or wait for the oldest, and start its replacement"""
+        self.fill(config)
+        jobs = self.jobs[config]
+        done = [entry for entry in jobs if entry[1].done()]
+        entry = done[0] if done else jobs[0]
+        jobs.remove(entry)
+        job, future = entry
+        try: return(future.result(timeout))
+        finally:
+            self.phases.pop(job, None)
+            self.submitted.pop(job, None)
+            self.fill(config)
+
+    def progress_text(self, config: MapConfig) -> str:
+        """Describe how far along the next map for config is, for a loading screen"""
+        while True:
+            try: job, phase = self.progress.get_nowait()
+            except queue.Empty: break
+            if job in self.submitted: self.phases[job] = phase
+        self.fill(config)
+        job, future = self.jobs[config][0]
+        map_width, map_height = config[:2]
+        elapsed = time.perf_counter()-self.submitted[job]
+        phase = self.phases.get(job)
+        status = f'{phase} done' if phase else 'starting'
+        return(f'Generating a {map_width}x{map_height} map: {status} ({elapsed:.1f}s)')
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
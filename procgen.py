@@ -1,27 +1,49 @@
-from typing import Iterator, Tuple, List, TYPE_CHECKING
+from typing import Iterator, Tuple, List, Optional, TYPE_CHECKING
 import random
-import time
 from game_map import GameMap
 import tile_types
 from entity import Entity
+from neighbors import circ_coords, count_adjacent, count_adjacent_padded, dilate, dilate_square
+from regions import build_zero_index, label_regions
+from profiling import GenerationReport
 import numpy as np
 
-circ_coords = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+# Side of the square blocks and height of the row bands the parallel generator works in. Fixed
+# rather than derived from the worker count, so the same seed makes the same map on any machine
+PARALLEL_BLOCK = 512
+# Tiles grown around each block and cropped off again, past which the extra bombs seeds leave
+# near the edges of the area they grow in have died away, and the wider margin grown on the low x
+# side, past which fill pass 1 has settled out of the stripes it starts a sweep with
+PARALLEL_HALO = 64
+PARALLEL_LEAD = 192
+# Tiles either side of a block edge that are swept again once the blocks are put together
+SEAM_CONTEXT = 4
+# Noise generator settings: the largest and smallest lattice cells in tiles, the rows worked on at
+# a time, the noise values sampled to find the bomb threshold and the smoothing steps run after it
+NOISE_LARGEST = 256
+NOISE_FINEST = 4
+NOISE_BAND = 256
+NOISE_SAMPLE = 1 << 20
+NOISE_SMOOTHING = 2
+# Side of the square around the start that a map without a region index opens, for the noise
+# generator's open plains, which can cover most of the map and take far longer to flood than to make
+START_WINDOW = 1024
+
 core_coords = ((-1, -1), (1, 1))
 corner_coords = ((-1, -1), (1, -1), (-1, 1), (1, 1))
 class GrowingSeed():
 
-    def __init__(self, gamemap: GameMap, allocated_space: int = 30, start_point: Tuple[int, int] = (0, 0)):
-        """Initialize the seed growth"""
+    def __init__(self, gamemap: GameMap, allocated_space: int = 30, start_point: Tuple[int, int] = (0, 0), rng = random):
+        """Initialize the seed growth, with rng being the random.Random its tendrils draw from"""
         self.gamemap, self.allocated_space, self.start_point = gamemap, allocated_space, start_point
         self.options = [[1, 0], [0, 1], [-1, 0], [0, -1]]
         self.coords = set()
         self.coords.update(set(((start_point),)))
         self.proceed = True
-        self.tendrils = {'right': Tendril(gamemap, self.add_coords(self.start_point, self.options[0])), 
-            'down': Tendril(gamemap, self.add_coords(self.start_point, self.options[1])),
-            'left': Tendril(gamemap, self.add_coords(self.start_point, self.options[2])),
-            'up': Tendril(gamemap, self.add_coords(self.start_point, self.options[3]))}
+        self.tendrils = {'right': Tendril(gamemap, self.add_coords(self.start_point, self.options[0]), rng), 
+            'down': Tendril(gamemap, self.add_coords(self.start_point, self.options[1]), rng),
+            'left': Tendril(gamemap, self.add_coords(self.start_point, self.options[2]), rng),
+            'up': Tendril(gamemap, self.add_coords(self.start_point, self.options[3]), rng)}
         for k, v in self.tendrils.items():
             self.coords.update(set(((v.origin),)))
         while len(self.coords)<self.allocated_space and self.proceed:
@@ -44,8 +66,9 @@ class GrowingSeed():
         if tally>3: self.proceed = False
     
 class Tendril():
-    def __init__(self, gamemap, start_point: Tuple[int, int]):
+    def __init__(self, gamemap, start_point: Tuple[int, int], rng = random):
         """Initialize the tendril"""
+        self.rng = rng
         self.coords = set((start_point))
         self.origin = start_point
         self.grow = True
@@ -55,7 +78,7 @@ class Tendril():
     def advance_one(self, options, ghost=[0, 1, 2, 3]) -> None:
         """Advance by one if possible, going through the options given recursively, stopping
         if all options are already in the tendril"""
-        cycle = random.choice(ghost)
+        cycle = self.rng.choice(ghost)
         potential = (self.head[0]+options[cycle][0], self.head[1]+options[cycle][1])
         if potential not in self.coords and potential[0]>=0 and potential[1]>=0 and(
             potential[0]<self.gamemap.width+6 and potential[1]<self.gamemap.height+6
@@ -69,22 +92,179 @@ class Tendril():
                 self.advance_one(options, ghost=ghost)
             else: self.grow = False
 
+class FreeSpotIndex():
+    """The tiles a new seed may start on: 1 in from the low edges, 2 in from the high ones and with
+    no claimed tile within radius of them"""
+    def __init__(self, width: int, height: int, radius: int = 0, block: int = 16):
+        self.width, self.height, self.radius, self.block = width, height, radius, block
+        # A mask of blocked tiles and a count of free tiles per block, updated as tiles are claimed,
+        # so drawing a spot is a weighted pick of a block and then of a tile inside it, never retried
+        self.occupied = np.zeros((width, height), dtype=bool, order='F')
+        self.reset()
+
+    def reset(self) -> None:
+        """Rebuild the blocked mask and block counts for the current radius from occupied"""
+        blocked = dilate_square(self.occupied, self.radius)
+        # Spots stay 1 in from the low edges and 2 in from the high ones, where seeds always started
+        blocked[:1], blocked[self.width-2:], blocked[:, :1], blocked[:, self.height-2:] = True, True, True, True
+        self.blocked = blocked
+        size = self.block
+        self.blocks_x, self.blocks_y = -(-self.width//size), -(-self.height//size)
+        padded = np.ones((self.blocks_x*size, self.blocks_y*size), dtype=bool, order='F')
+        padded[:self.width, :self.height] = blocked
+        self.free = (size*size-padded.reshape(size, self.blocks_x, size, self.blocks_y, order='F').sum(axis=(0, 2))).ravel(order='F')
+
+    def claim(self, coords) -> None:
+        """Mark tiles as claimed, blocking every tile within radius of them"""
+        coords = np.array(coords, dtype=np.int64).reshape(-1, 2)
+        coords = coords[(coords >= 0).all(axis=1) & (coords < (self.width, self.height)).all(axis=1)]
+        if not len(coords): return
+        x0, y0 = coords.min(axis=0)
+        x1, y1 = coords.max(axis=0)+1
+        claimed = np.zeros((x1-x0, y1-y0), dtype=bool, order='F')
+        claimed[coords[:, 0]-x0, coords[:, 1]-y0] = True
+        self.claim_mask(claimed, x0, y0)
+
+    def sync(self, occupied) -> None:
+        """Claim whatever has been marked in an occupied mask since the last sync"""
+        self.claim_mask(occupied & ~self.occupied)
+
+    def claim_mask(self, claimed, x0: int = 0, y0: int = 0) -> None:
+        """Claim the tiles set in a mask whose top left corner is at (x0, y0)"""
+        width, height = claimed.shape
+        self.occupied[x0:x0+width, y0:y0+height] |= claimed
+        # Grow the claimed tiles by radius, then block whatever that reaches that was still free
+        r = self.radius
+        gx0, gy0 = max(x0-r, 0), max(y0-r, 0)
+        gx1, gy1 = min(x0+width+r, self.width), min(y0+height+r, self.height)
+        grown = np.zeros((gx1-gx0, gy1-gy0), dtype=bool, order='F')
+        grown[x0-gx0:x0-gx0+width, y0-gy0:y0-gy0+height] = claimed
+        grown = dilate_square(grown, r)
+        xs, ys = np.nonzero(grown & ~self.blocked[gx0:gx1, gy0:gy1])
+        xs, ys = xs+gx0, ys+gy0
+        self.blocked[xs, ys] = True
+        np.subtract.at(self.free, xs//self.block+(ys//self.block)*self.blocks_x, 1)
+
+    def sample(self, rng = random) -> Optional[Tuple[int, int]]:
+        """Draw a free spot uniformly and claim it, shrinking the radius when none is left,
+        or return None once the map is full"""
+        while True:
+            total = int(self.free.sum())
+            if total: break
+            if not self.radius: return(None)
+            self.radius -= 1
+            self.reset()
+        pick = rng.randrange(total)
+        counts = np.cumsum(self.free)
+        index = int(np.searchsorted(counts, pick, side='right'))
+        pick -= int(counts[index-1]) if index else 0
+        bx, by = index%self.blocks_x, index//self.blocks_x
+        size = self.block
+        window = self.blocked[bx*size:(bx+1)*size, by*size:(by+1)*size]
+        x, y = np.argwhere(~window)[pick]
+        spot = (int(x)+bx*size, int(y)+by*size)
+        self.claim([spot])
+        return(spot)
+
+def isolation_radius(threshold: int) -> int:
+    """How far from claimed space a seeding threshold asks a new seed to start:
+    1 checks the tile's neighbors, up to 4 its neighbors' neighbors, and past that one ring further"""
+    return(0 if threshold <= 0 else 1 if threshold == 1 else 2 if threshold <= 4 else 3)
+
 def generate_map(
     map_width: int,
     map_height: int,
     desired_bomb_percent: int,
-    playable: bool) -> GameMap:
-    """Generate a new minesweeper map."""
+    playable: bool,
+    region_index: bool = True,
+    generator: str = 'tendril',
+    seed = None,
+    report: Optional[GenerationReport] = None,
+    workers: Optional[int] = None,
+    no_guess: bool = False,
+    analyze: bool = False) -> GameMap:
+    """Generate a new minesweeper map, the same one every time for the same seed. Generation is
+    silent, the time spent in each phase being kept in report (or a fresh one) as mine_map.report"""
 
     mine_map = GameMap(map_width, map_height)
-    gen_start = time.time()
+    # seed may be an int, a random.Random or a numpy Generator
+    rng = make_rng(seed)
+    report = mine_map.report = report or GenerationReport()
+    mine_map.params = {'map_width': map_width, 'map_height': map_height, 'desired_bomb_percent': desired_bomb_percent,
+        'playable': playable, 'generator': generator, 'seed': seed if isinstance(seed, int) else None, 'no_guess': no_guess}
+    # 'tendril' grows GrowingSeeds one step at a time and 'batched' grows each batch of seeds together
+    # as arrays, far faster on big maps for the same blob-like landscape. 'parallel' grows square
+    # blocks of the map, each from its own seed, across workers processes (all cores by default),
+    # and 'noise' thresholds smoothed value noise into lakes of bombs, the fastest by far
+    if generator == 'tendril':
+        occupied = grow_tendril_layout(map_width, map_height, desired_bomb_percent, mine_map, rng, report)
+    elif generator == 'batched':
+        occupied = grow_batched_layout(map_width, map_height, desired_bomb_percent, rng, report)
+    elif generator == 'parallel':
+        expl = grow_parallel_layout(map_width, map_height, desired_bomb_percent, playable, rng, report, workers)
+    elif generator == 'noise':
+        expl = grow_noise_layout(map_width, map_height, desired_bomb_percent, rng, report)
+    else: raise ValueError(f"Unknown generator {generator!r}")
+    with report.phase('shifting'):
+        mine_map.explosive[:] = ~occupied[3:map_width+3, 3:map_height+3] if generator in ('tendril', 'batched') else expl
+    if playable:
+        # The parallel generator fills gaps as it goes, and noise keeps its bombs in solid lakes that
+        # filling gorges would hollow out, away from the requested share of bombs
+        if generator in ('parallel', 'noise'): mine_map, start_points = count_bombs(mine_map, mine_map.explosive[:], report)
+        else: mine_map, start_points = fill_gaps(mine_map, rng, report)
+        # An index of the blank regions makes reveals instant, unless the map is too large for it
+        if region_index:
+            with report.phase('region index'):
+                mine_map.zero_regions = build_zero_index(mine_map)
+        window = START_WINDOW if generator == 'noise' and mine_map.zero_regions is None else None
+        with report.phase('start reveal'):
+            reveal_squares_around_start(start_points, mine_map, rng, window)
+        if no_guess:
+            # Bombs are moved away from wherever solving the map from its start would need a guess.
+            # solver uses procgen's reveals, so it is only imported once it is needed
+            import solver
+            solver.make_solvable(mine_map, rng, report)
+    else: 
+        window = START_WINDOW if generator == 'noise' else None
+        with report.phase('start reveal'):
+            try_until_pop(map_width, map_height, mine_map, rng, report, window)
+    # The finished map's measurements go in the report's metrics
+    if analyze:
+        import analysis
+        with report.phase('analysis'):
+            report.metrics.update(analysis.analyze(mine_map, desired_bomb_percent))
+    return mine_map
+
+def position_seed(seed: int, *position: int) -> int:
+    """A seed for one piece of a map, mixed from the map's seed and the piece's position,
+    so pieces can be generated apart and in any order and still come out the same"""
+    return(int(np.random.SeedSequence([seed, *position]).generate_state(2, dtype=np.uint64)[0]))
+
+def make_rng(seed = None) -> random.Random:
+    """Return the random.Random that generation draws from for a seed, which may be None
+    for a fresh unseeded run, an int, a random.Random or a numpy Generator"""
+    if isinstance(seed, random.Random): return(seed)
+    if isinstance(seed, np.random.Generator): return(random.Random(int(seed.integers(1 << 63))))
+    return(random.Random(seed))
+
+def numpy_rng(rng = random) -> np.random.Generator:
+    """Return a numpy Generator drawn from rng, for the passes that need whole arrays of randomness"""
+    return(np.random.default_rng(rng.getrandbits(64)))
+
+def preset_seed_points(map_width, map_height):
+    """Return the initial coords of the preset map seeds, spread around the center"""
     indexes = []
-    #Create the preset map seeds initial coords
     for x in range(1, 4):
         for y in range(1, 4):
             if x != 2 and y != 2:
-                indexes.append(((map_height+6)*y//4, (map_width+6)*x//4))
-    print(f'Generation Started at {round((time.time()-gen_start), 2)}')
+                indexes.append(((map_width+6)*x//4, (map_height+6)*y//4))
+    return(indexes)
+
+def grow_tendril_layout(map_width, map_height, desired_bomb_percent, mine_map, rng = random, report = None):
+    """Grow GrowingSeeds one after another until enough safe space is claimed, returning the
+    occupied tiles of the map padded by 3 on every side"""
+    report = report or GenerationReport()
+    indexes = preset_seed_points(map_width, map_height)
     threshold = max(map_width//50, map_height//50)
     free_space_total = (map_width+6)*(map_height+6)
     bomb_num = free_space_total*desired_bomb_percent//100
@@ -92,12 +272,14 @@ def generate_map(
     initial_safe = safe_num
     center = (map_width//2, map_height//2)
     #Create the first seed in the center of the map
-    seed = GrowingSeed(mine_map, random.randint(safe_num//10, safe_num//5), center)
+    with report.phase('seeding'):
+        seed = GrowingSeed(mine_map, rng.randint(safe_num//10, safe_num//5), center, rng)
     safe_num -= len(seed.coords)
+    spots = FreeSpotIndex(map_width+6, map_height+6, isolation_radius(threshold))
+    spots.claim(list(seed.coords))
     seeds = [seed]
     total_coords = set()
     total_coords.update(seed.coords)
-    print(f'First seed done at {round((time.time()-gen_start), 2)}')
     trial = 0
     while safe_num > (free_space_total-bomb_num)//10:
         if trial <= len(indexes)-1:
@@ -107,131 +289,350 @@ def generate_map(
         else: 
             if trial==len(indexes):
                 trial+=1
-                print(f'Preset seeds done at {round((time.time()-gen_start), 2)}, starting random')
-            else: print(f'New random seed at {round((time.time()-gen_start), 2)}')
             trial += 1
             if trial < 20: counter = trial
             else: counter = 20
-            amount = random.randint(((free_space_total-bomb_num)//25), safe_num//(21-counter))
-            start = rand_start_point(map_width+6, map_height+6, mine_map, total_coords, threshold=threshold)
-            #print(f'Random start found at {round((time.time()-gen_start), 2)}, generating')
-        seeds.append(GrowingSeed(mine_map, amount, start))
+            amount = rng.randint(((free_space_total-bomb_num)//25), safe_num//(21-counter))
+            with report.phase('random seed placement'):
+                start = spots.sample(rng)
+            # With nowhere left to start a seed, what is unclaimed stays bombs
+            if start is None: break
+        with report.phase('seeding'):
+            seeds.append(GrowingSeed(mine_map, amount, start, rng))
         total_coords.update(seeds[-1].coords)
+        spots.claim(list(seeds[-1].coords))
         safe_num = free_space_total-bomb_num-len(total_coords)
-    print(f'Seeds complete, shifting at {round((time.time()-gen_start), 2)}')
-    for x, y in total_coords:
-        if not(x<=2 or y<=2 or y>=map_height+3 or x>=map_width+3):
-            mine_map.tiles[x-3, y-3] = tile_types.safe
-            mine_map.explosive[x-3, y-3] = False
+    occupied = np.zeros((map_width+6, map_height+6), dtype=bool, order='F')
+    xs, ys = np.array(list(total_coords)).T
+    occupied[xs, ys] = True
+    return(occupied)
+
+def grow_batched_layout(map_width, map_height, desired_bomb_percent, rng = random, report = None, batch_size = 4, presets = True):
+    """Same seeding plan as grow_tendril_layout, grown a batch of seeds at a time through
+    grow_seeds_batched. Without presets only the random seeds are grown, so no spot stands out"""
+    indexes = preset_seed_points(map_width, map_height)
+    free_space_total = (map_width+6)*(map_height+6)
+    bomb_num = free_space_total*desired_bomb_percent//100
+    initial_safe = free_space_total-bomb_num
+    report = report or GenerationReport()
+    np_rng = numpy_rng(rng)
+    occupied = np.zeros((map_width+6, map_height+6), dtype=bool, order='F')
+    threshold = max(map_width//50, map_height//50)
+    spots = FreeSpotIndex(map_width+6, map_height+6, isolation_radius(threshold))
+    starts = [(map_width//2, map_height//2)] + indexes
+    amounts = [rng.randint(initial_safe//10, initial_safe//5)] + [initial_safe//20]*len(indexes)
+    if not presets: claimed = 0
+    else:
+        with report.phase('seeding'):
+            claimed = grow_seeds_batched(occupied, starts, amounts, np_rng)
+    safe_num = initial_safe-claimed
+    trial = len(indexes)+1
+    while safe_num > initial_safe//10:
+        # Size the batch's seeds as if each were grown after the ones before it
+        amounts = []
+        while len(amounts) < batch_size and safe_num > initial_safe//10:
+            counter = min(trial, 20)
+            amounts.append(rng.randint(initial_safe//25, max(initial_safe//25, safe_num//(21-counter))))
+            safe_num -= amounts[-1]
+            trial += 1
+        with report.phase('random seed placement'):
+            spots.sync(occupied)
+            starts = [spot for spot in (spots.sample(rng) for _ in amounts) if spot]
+        if not starts: break
+        with report.phase('seeding'):
+            claimed += grow_seeds_batched(occupied, starts, amounts[:len(starts)], np_rng)
+        safe_num = initial_safe-claimed
+    return(occupied)
+
+def grow_parallel_layout(map_width, map_height, desired_bomb_percent, playable, rng = random, report = None, workers = None):
+    """Return whether each tile is a bomb, grown (and for playable maps gap filled) in
+    PARALLEL_BLOCK squares by grow_block across a process pool"""
+    report = report or GenerationReport()
+    base = rng.getrandbits(63)
+    size = PARALLEL_BLOCK
+    expl = np.empty((map_width, map_height), dtype=bool, order='F')
+    blocks = [(x, y) for x in range(0, map_width, size) for y in range(0, map_height, size)]
+    # Imported here, as the process pool machinery costs more to load than the rest of procgen
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        with report.phase('seeding'):
+            # Every block draws from a seed made from rng and its position, so the map depends on
+            # the seed and not on how the work was split up
+            args = [(size, PARALLEL_HALO, PARALLEL_LEAD, desired_bomb_percent, playable, position_seed(base, 0, x//size, y//size))
+                for x, y in blocks]
+            for (x, y), block in zip(blocks, pool.map(grow_block, args)):
+                expl[x:x+size, y:y+size] = block[:map_width-x, :map_height-y]
     if playable:
-        print(f'Shifting complete, filling gaps at {round((time.time()-gen_start), 2)}')
-        mine_map, start_points = fill_gaps(gen_start, mine_map)
-        print(f"Filling done, revealing start at {round((time.time()-gen_start), 2)}")
-        #reveal_all_blanks(start_points, mine_map)
-        reveal_squares_around_start(start_points, mine_map)
-        print(f"Start revealed, game begins at {round((time.time()-gen_start), 2)}")
-    else: 
-        print(f'Shifting complete, trying to reveal start {round((time.time()-gen_start), 2)}')
-        try_until_pop(map_width, map_height, mine_map)
-    return mine_map
+        with report.phase('seam fill'):
+            fill_seams(expl, size)
+    report.note(f'Generated in {len(blocks)} blocks')
+    return(expl)
 
-def rand_start_point(map_width, map_height, mine_map, total_coords, threshold = 0):
-    """Repeatedly check random points on the map for a certain radius of
-    openness for a new seed based on the size of the map, returning a properly isolated point"""
-    go = False
-    rounds = 0
-    while not go:
-        coord = (random.randint(1, map_width-3), random.randint(1, map_height-3))
-        if coord not in total_coords: 
-            if not threshold: go=True
-            else: 
-                if not sum_safes(coord, mine_map):
-                    if threshold == 1: go = True
-                    else:
-                        around = return_circle_coords(coord, mine_map)
-                        count = 0
-                        for pair in around:
-                            if sum_safes(pair, mine_map): count+=1
-                            if threshold > 4:
-                                around2 = return_circle_coords(pair, mine_map)
-                                for pair2 in around2:
-                                    if sum_safes(pair2, mine_map): count+=1
-                        if not count: go = True
-        rounds += 1
-        if rounds > 200:
-            if threshold > 0:
-                return(rand_start_point(map_width, map_height, mine_map, total_coords, threshold-1))
-            else: return(0, 0)
-    return(coord)
-
-def fill_gaps(gen_start, mine_map):
+def grow_noise_layout(map_width, map_height, desired_bomb_percent, rng = random, report = None):
+    """Return whether each tile is a bomb, the lowest desired_bomb_percent of multi-octave value
+    noise, smoothed by a few cellular automaton steps"""
+    report = report or GenerationReport()
+    np_rng = numpy_rng(rng)
+    noise = np.zeros((map_width, map_height), dtype=np.float32, order='F')
+    # Random values on coarse grids, smoothly interpolated up to the map and summed with halving
+    # weights, from lattice cells NOISE_LARGEST tiles across down to NOISE_FINEST. All of it is
+    # whole-array work in bands of NOISE_BAND rows, so memory stays a few bytes per tile
+    with report.phase('noise'):
+        cell, weight = min(NOISE_LARGEST, max(map_width, map_height, 2*NOISE_FINEST)/2), 1.0
+        while cell >= NOISE_FINEST:
+            add_value_noise(noise, cell, weight, np_rng)
+            cell, weight = cell/2, weight/2
+    with report.phase('threshold'):
+        # A sample is plenty to place the cut, and far cheaper than sorting every tile
+        sample = np_rng.choice(noise.ravel(order='K'), min(noise.size, NOISE_SAMPLE))
+        cut = np.float32(np.quantile(sample, desired_bomb_percent/100))
+        expl = np.empty((map_width, map_height), dtype=bool, order='F')
+        for y in range(0, map_height, NOISE_BAND):
+            np.less(noise[:, y:y+NOISE_BAND], cut, out=expl[:, y:y+NOISE_BAND])
+        del noise
+    with report.phase('smoothing'):
+        for _ in range(NOISE_SMOOTHING):
+            smooth_step(expl)
+    return(expl)
+
+def add_value_noise(noise, cell, weight, np_rng):
+    """Add one octave of value noise with lattice points cell tiles apart to noise, times weight"""
+    width, height = noise.shape
+    lattice = np_rng.random((int(width/cell)+2, int(height/cell)+2), dtype=np.float32)*np.float32(weight)
+    def stops(length):
+        at = np.arange(length, dtype=np.float32)/np.float32(cell)
+        index = at.astype(np.intp)
+        t = at-index
+        # Smoothstep, so the slopes meet without creases at the lattice lines
+        return(index, t*t*(3-2*t))
+    ix, tx = stops(width)
+    iy, ty = stops(height)
+    # Along x once for every lattice row, then along y for each run of rows between the same two
+    # lattice rows, as a broadcast of that pair rather than a gather per row
+    rows = lattice[ix]
+    rows += (lattice[ix+1]-rows)*tx[:, None]
+    slopes = np.diff(rows, axis=1)
+    starts = np.flatnonzero(np.diff(iy, prepend=-1))
+    scratch = np.empty((width, int(np.ceil(cell))+1), dtype=np.float32, order='F')
+    for start, end in zip(starts.tolist(), np.append(starts[1:], height).tolist()):
+        k, out = iy[start], scratch[:, :end-start]
+        np.multiply(slopes[:, k, None], ty[start:end], out=out)
+        out += rows[:, k, None]
+        noise[:, start:end] += out
+
+def smooth_step(expl):
+    """One cellular automaton step in place: tiles with 5 or more bombs around them become bombs,
+    and those with 3 or fewer become safe. Run in bands, each seeing its neighbors' old rows"""
+    width, height = expl.shape
+    above = np.zeros(width, dtype=bool)
+    for y in range(0, height, NOISE_BAND):
+        end = min(y+NOISE_BAND, height)
+        padded = np.zeros((width+2, end-y+2), dtype=np.uint8, order='F')
+        padded[1:-1, 0] = above
+        padded[1:-1, 1:-1] = expl[:, y:end]
+        if end < height: padded[1:-1, -1] = expl[:, end]
+        above = expl[:, end-1].copy()
+        count = count_adjacent_padded(padded)
+        band = expl[:, y:end]
+        band[count >= 5] = True
+        band[count <= 3] = False
+
+def grow_block(args):
+    """Grow one PARALLEL_BLOCK square of grow_parallel_layout, returning whether each tile is a bomb"""
+    size, halo, lead, desired_bomb_percent, playable, seed = args
+    rng = make_rng(seed)
+    # Grown and filled with a margin all round that is cropped off again, so the square keeps
+    # clear of the extra bombs left where seeds bounce off the edges and where the fill starts.
+    # The preset seeds would sit in the same spot of every block and show up as a grid
+    occupied = grow_batched_layout(lead+size+halo, size+2*halo, desired_bomb_percent, rng, presets=False)
+    expl = ~occupied[3:-3, 3:-3]
+    if playable: fill_gorges(expl, numpy_rng(rng))
+    return(expl[lead:lead+size, halo:halo+size])
+
+def fill_seams(expl, step):
+    """Sweep the tiles either side of every block edge again, turning any bomb with fewer than 2
+    safe neighbors across the edge safe as fill pass 1 would have"""
+    width, height = expl.shape
+    for x in range(step, width, step):
+        strip = expl[x-SEAM_CONTEXT:x+SEAM_CONTEXT].copy(order='F')
+        # No coin, so a bomb is only turned safe when nothing else would do
+        sweep_gorges(strip, np.zeros(strip.shape, dtype=bool))
+        expl[x-1:x+1] = strip[SEAM_CONTEXT-1:SEAM_CONTEXT+1]
+    for y in range(step, height, step):
+        strip = expl[:, y-SEAM_CONTEXT:y+SEAM_CONTEXT].copy(order='F')
+        sweep_gorges(strip, np.zeros(strip.shape, dtype=bool))
+        expl[:, y-1:y+1] = strip[:, SEAM_CONTEXT-1:SEAM_CONTEXT+1]
+
+def grow_seeds_batched(occupied, starts, amounts, np_rng):
+    """Grow one seed from each start point, like a GrowingSeed, until it has claimed its amount of
+    unoccupied tiles, marking them in occupied and returning how many were claimed in total"""
+    # Every tendril of every seed walks a whole stretch of steps per round as arrays, bouncing off
+    # the edges, and tiles are handed out in step order so the result matches growing them side by side
+    width, height = occupied.shape
+    flat = occupied.ravel(order='F')
+    options = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]], dtype=np.int32)
+    starts = np.array(starts).reshape(-1, 2)
+    remaining = np.array(amounts, dtype=np.int64)
+    # Each seed claims its start point and the 4 tendril origins around it first
+    heads = (starts[:, None, :]+options[None, :, :]).reshape(-1, 2)
+    owner = np.repeat(np.arange(len(starts)), 4)
+    claimed = 0
+    for points, who in ((starts, np.arange(len(starts))), (heads, owner)):
+        points = reflect(points, (width, height))
+        cells = points[:, 0]+points[:, 1]*width
+        cells, first = np.unique(cells, return_index=True)
+        fresh = ~flat[cells]
+        flat[cells[fresh]] = True
+        got = np.bincount(who[first[fresh]], minlength=len(starts))
+        remaining -= got
+        claimed += int(got.sum())
+    heads = reflect(heads, (width, height))
+    # Scratch space for finding the first step to reach each tile without sorting
+    stamp = np.empty(width*height, dtype=np.int32)
+    while (remaining > 0).any():
+        walking = np.flatnonzero(remaining[owner] > 0)
+        steps = int(np.clip(remaining.max()//2, 64, 1 << 16))
+        moves = options[np_rng.integers(0, 4, (len(walking), steps))]
+        path = reflect(heads[walking, None, :]+np.cumsum(moves, axis=1), (width, height))
+        heads[walking] = path[:, -1]
+        # Step-major order, so earlier steps of any tendril claim a tile before later ones
+        cells = (path[:, :, 0]+path[:, :, 1].astype(np.int64)*width).T.ravel()
+        who = np.tile(owner[walking], steps)
+        fresh = np.flatnonzero(~flat[cells])
+        stamp[cells[fresh[::-1]]] = np.arange(len(fresh)-1, -1, -1, dtype=np.int32)
+        first = fresh[stamp[cells[fresh]] == np.arange(len(fresh), dtype=np.int32)]
+        # Stop each seed once it has its amount, dropping whatever it reached afterwards
+        for seed in np.flatnonzero(remaining > 0):
+            keep = first[who[first] == seed][:remaining[seed]]
+            flat[cells[keep]] = True
+            remaining[seed] -= len(keep)
+            claimed += len(keep)
+    return(claimed)
+
+def reflect(points, bounds):
+    """Fold points back inside [0, bound) along each axis, as if walking into an edge bounced off it"""
+    points = np.array(points, dtype=np.int32)
+    for axis, bound in enumerate(bounds):
+        period = max(2*(bound-1), 1)
+        folded = points[..., axis] % period
+        points[..., axis] = np.where(folded >= bound, period-folded, folded)
+    return(points)
+
+def fill_gaps(mine_map, rng = random, report = None):
     """Fill up bomb gorges in a semi-random way, then assign values to each tile
-    according to the number of bombs in their direct proximity"""
-    gen_start = gen_start
-    start_points = set()
-    bounds = np.shape(mine_map.tiles)
-    prev_circle = return_circle_coords((0, 0), mine_map)
-    tiles = mine_map.tiles
-    expl = mine_map.explosive
-    # First pass to fill in isolated bomb gorges
-    for x in range(bounds[0]):
-        for y in range(bounds[1]):
-            now, prev_circle = sum_safes_with_back_tracking((x, y), mine_map, prev_circle)
-            if now < 2:
-                tiles[x, y] = tile_types.safe
-                expl[x, y] = False
-            elif now == 2:
-                if random.random()>0.5:
-                    tiles[x, y] = tile_types.safe
-                    expl[x, y] = False
-    print(f"First pass complete in filling, onto second at {round((time.time()-gen_start), 2)}")
-    # Second pass to cover isolated spaces that were converted, but still have no others around them
-    prev_circle = return_circle_coords((0, 0), mine_map)
-    for x in range(bounds[0]):
-        for y in range(bounds[1]):
-            now, prev_circle = sum_safes_with_back_tracking((x, y), mine_map, prev_circle)
-            if now < 1:
-                new = return_random_adjacent((x, y), mine_map)
-                tiles[new] = tile_types.safe
-                expl[new] = False
-    print(f"Second pass complete, updating all tiles to finish at {round((time.time()-gen_start), 2)}")
+    according to the number of bombs in their direct proximity. Each pass works on
+    whole rows or whole-map neighbor counts rather than walking the map tile by tile"""
+    expl = mine_map.explosive[:]
+    report = report or GenerationReport()
+    fill_gorges(expl, numpy_rng(rng), report)
+    return(count_bombs(mine_map, expl, report))
+
+def count_bombs(mine_map, expl, report = None):
+    """The last pass of fill_gaps, writing expl and the number of bombs around each tile into the map's
+    cells and returning the map and its blank tiles"""
+    report = report or GenerationReport()
     # Update numbombs for each square, and change square number accordingly
-    prev_circle = return_circle_coords((0, 0), mine_map)
-    for x in range(bounds[0]):
-        for y in range(bounds[1]):
-            count, prev_circle = sum_bombs_with_back_tracking((x, y), mine_map, prev_circle)
-            tiles[x, y]['numbomb'] = count
-            if tiles[x, y]['numbomb'] and not expl[x, y]:
-                tiles[x, y]['light'][0] = ord(str(tiles[x, y]['numbomb']))
-            else: start_points.update(((x, y),))
+    with report.phase('fill pass 3'):
+        numbomb = count_adjacent(expl)
+        mine_map.cells[...] = np.where(expl, tile_types.EXPLOSIVE, 0) | numbomb
+        mine_map.mark_dirty()
+        start_points = np.argwhere((numbomb == 0) & ~expl)
     return(mine_map, start_points)
 
-def return_random_adjacent(tile_address, mine_map, unwanted=False, trial = 0, bounds=None):
-    """Repeatedly try random adjacent spots until one is in bounds and not of the unwanted explosive variety.
-    If none of them work after 150 attempts, simply returns the tile address given. Can preset the trial number
-    to heighten or lower the number of allowed attempts"""
-    if not bounds: bounds = np.shape(mine_map.tiles)
-    idea = [tile_address[0]+random.randint(-1, 1), tile_address[1]+random.randint(-1, 1)]
-    if idea != tile_address and check_in_bounds(idea, bounds) and (
-        mine_map.explosive[idea[0], idea[1]] != unwanted):
-        return(idea)
-    elif trial<150: 
-        trial+=1
-        return(return_random_adjacent(tile_address, mine_map, trial=trial, bounds=bounds))
-    else: return(tile_address)
+def move_bombs(mine_map, sources, destinations):
+    """Turn the bombs at the (n, 2) sources into safe tiles and the safe tiles at destinations
+    into bombs, recounting the bombs around every tile next to them"""
+    mine_map.explosive[sources[:, 0], sources[:, 1]] = False
+    mine_map.explosive[destinations[:, 0], destinations[:, 1]] = True
+    moved = np.concatenate([sources, destinations])
+    near = (moved[:, None, :]+np.array(((0, 0),)+circ_coords)).reshape(-1, 2)
+    near = near[(near[:, 0] >= 0) & (near[:, 1] >= 0) & (near[:, 0] < mine_map.width) & (near[:, 1] < mine_map.height)]
+    xs, ys = np.unique(near, axis=0).T
+    counts = np.zeros(len(xs), dtype=np.uint8)
+    for dx, dy in circ_coords:
+        nx, ny = xs+dx, ys+dy
+        fits = (nx >= 0) & (ny >= 0) & (nx < mine_map.width) & (ny < mine_map.height)
+        counts[fits] += mine_map.explosive[nx[fits], ny[fits]]
+    mine_map.numbomb[xs, ys] = counts
+    mine_map.mark_dirty(xs.min(), ys.min(), xs.max()+1, ys.max()+1)
+
+def fill_gorges(expl, np_rng, report = None):
+    """The first two passes of fill_gaps, turning bombs in expl to safe spaces in place"""
+    report = report or GenerationReport()
+    # First pass to fill in isolated bomb gorges, flipping a coin for tiles with exactly 2 safe neighbors
+    with report.phase('fill pass 1'):
+        sweep_gorges(expl, np_rng.random(expl.shape) > 0.5)
+    # Second pass to cover isolated spaces that were converted, but still have no others around them
+    with report.phase('fill pass 2'):
+        lonely = np.argwhere(count_adjacent(~expl) == 0)
+        if len(lonely):
+            new = random_adjacent_coords(lonely, expl.shape, np_rng)
+            expl[new[:, 0], new[:, 1]] = False
+    return(expl)
+
+def sweep_gorges(expl, coin):
+    """Convert bombs with fewer than 2 safe neighbors, or exactly 2 when coin is set, to safe spaces,
+    sweeping the map in the order the tile by tile loop went"""
+    # Conversions raise the safe counts of later tiles, so judging the whole map at once converts far
+    # too much. Instead it is swept one row at a time, each row seeing the rows converted before it
+    # and each tile the tiles converted to its left; the rows here are the columns of the map, swept
+    # down each column in the order the tile by tile loop went
+    expl, coin = expl.T, coin.T
+    width, height = expl.shape
+    outside = np.zeros(width, dtype=bool)
+    index = np.arange(width)
+    for y in range(height):
+        row = expl[:, y]
+        # Safe neighbors apart from the left one, which the scan supplies
+        count = adjacent_in_row(~expl[:, y-1] if y else outside, True)
+        count += adjacent_in_row(~expl[:, y+1] if y < height-1 else outside, True)
+        count[:-1] += ~row[1:]
+        left_bomb = (count < 2) | ((count == 2) & coin[:, y])
+        left_safe = (count < 1) | ((count == 1) & coin[:, y])
+        # Only the left neighbor changes a tile's count within the row, so a tile either ends up the
+        # same whatever that neighbor did (it is fixed) or the opposite of it. A tile then ends up as
+        # the last fixed one before it, flipped once per tile in between, in one scan of the row
+        fixed = ~row | (left_bomb == left_safe)
+        safe = ~row | left_bomb
+        anchor = np.maximum.accumulate(np.where(fixed, index, -1))
+        # Past the left edge counts as a bomb, like an unsafe fixed tile at -1
+        anchored = np.where(anchor >= 0, safe[anchor], False)
+        expl[:, y] = ~(anchored ^ ((index-anchor) & 1).astype(bool))
+
+def adjacent_in_row(row, include_self):
+    """Return how many of each tile's left and right neighbors (and itself if asked) are set in row"""
+    padded = np.zeros(len(row)+2, dtype=np.uint8)
+    padded[1:-1] = row
+    count = padded[:-2] + padded[2:]
+    if include_self: count += padded[1:-1]
+    return(count)
+
+def random_adjacent_coords(coords, bounds, np_rng, trials = 8):
+    """Pick a random in-bounds neighbor for every row of coords, leaving a row on its own address
+    if no neighbor is found within the given number of trials"""
+    offsets = np.array(circ_coords)
+    chosen = coords.copy()
+    pending = np.arange(len(coords))
+    for _ in range(trials):
+        candidate = coords[pending] + offsets[np_rng.integers(0, 8, len(pending))]
+        fits = (candidate >= 0).all(axis=1) & (candidate < bounds).all(axis=1)
+        chosen[pending[fits]] = candidate[fits]
+        pending = pending[~fits]
+        if not len(pending): break
+    return(chosen)
 
 def return_surrounding_types(tile_address, mine_map):
     """Return a list of surrounding tile types"""
     output = return_circle_coords(tile_address, mine_map)
     ret = []
-    for x, y in output: ret.append(mine_map.tiles[x, y]['explosive'])
+    for x, y in output: ret.append(mine_map.explosive[x, y])
     return(ret)
 
 def return_circle_coords_old(tile_address, mine_map):
     """Return the Tuple addresses for all 8 surrounding squares for a tile, less if it is an edge,
     adjusting to the bounds of the map accordingly"""
     output = []
-    bounds = np.shape(mine_map.tiles)
+    bounds = (mine_map.width, mine_map.height)
     for x in range(-1, 2):
         for y in range(-1, 2):
             perhaps = (tile_address[0]+x, tile_address[1]+y)
@@ -243,7 +644,7 @@ def return_circle_coords(tile_address, mine_map):
     """Return the tuple addresses for the surrounding squares, only running corner collision checks
     unless there is a wall of some kind. Speeds up pop_clears"""
     output = []
-    bounds = np.shape(mine_map.tiles)
+    bounds = (mine_map.width, mine_map.height)
     for x, y in core_coords:
         perhaps = (tile_address[0]+x, tile_address[1]+y)
         if check_in_bounds(perhaps, bounds):
@@ -253,29 +654,88 @@ def return_circle_coords(tile_address, mine_map):
         output.append((tile_address[0]+x, tile_address[1]+y))
     return(output)
 
-def pop_clears(tile_address, mine_map, round = 0):
-    """Repeatedly reveal both the tile_address and its surroundings if it has no bombs 
-    adjacent to it, with a given 300 recursive attempts to get them all. This means not all
-    of massive landscapes at 100*100 maps and up are revealed in one go, but it is needed to
-    avoid looping and recursion limits in interior functions"""
-    if not mine_map.tiles[tile_address[0], tile_address[1]]['numbomb'] and (
-        not mine_map.tiles[tile_address[0], tile_address[1]]['explosive']):
-        mine_map.revealed[tile_address[0], tile_address[1]] = True
-        for x, y in return_circle_coords(tile_address, mine_map):
-            mine_map.revealed[x, y] = True
-            around = []
-            for w, z in return_circle_coords((x, y), mine_map):
-                around.append(mine_map.revealed[w, z])
-            if not all(around):
-                stuck = set()
-                for a, b in return_circle_coords((x, y), mine_map):
-                    if not mine_map.revealed[a, b]:
-                        stuck.update(((a, b),))
-                        break
-                if round<300:
-                    round+=1
-                    for coord1, coord2 in stuck:
-                        pop_clears((coord1, coord2), mine_map, round=round)
+def pop_clears(tile_address, mine_map):
+    """Reveal the whole blank region connected to tile_address along with its numbered border,
+    apart from flagged tiles, returning how many tiles were newly revealed"""
+    return(pop_clears_bounds(tile_address, mine_map)[0])
+
+def pop_clears_bounds(tile_address, mine_map):
+    """pop_clears, also returning the rectangle (ends exclusive) holding the tiles it revealed,
+    or None if it revealed none"""
+    x, y = int(tile_address[0]), int(tile_address[1])
+    if not mine_map.blank((x, y)): return(0, None)
+    if mine_map.zero_regions is not None: return(mine_map.zero_regions.reveal((x, y), mine_map))
+    width, height = mine_map.width, mine_map.height
+    dx, dy = np.array(circ_coords).T
+    # Walked breadth-first with the whole frontier expanded in one step, so there is no recursion
+    # limit however large the open landscape is. The scratch space only covers a window (x0, y0)
+    # to (x1, y1) around the tiles reached so far, grown by its own size on every side whenever
+    # the region spreads past it, so a click costs as much as the region it opens, not the map
+    x0, y0, x1, y1 = x, y, x+1, y+1
+    visited = np.ones((1, 1), dtype=bool, order='F')
+    # Scratch space for dropping duplicate tiles reached from several frontier tiles at once
+    stamp = np.empty((1, 1), dtype=np.int32, order='F')
+    xs, ys = np.array([x]), np.array([y])
+    reached_x, reached_y = [xs], [ys]
+    while len(xs):
+        nx, ny = (xs[:, None]+dx).ravel(), (ys[:, None]+dy).ravel()
+        fits = (nx >= 0) & (ny >= 0) & (nx < width) & (ny < height)
+        nx, ny = nx[fits], ny[fits]
+        if not len(nx): break
+        lo_x, lo_y, hi_x, hi_y = int(nx.min()), int(ny.min()), int(nx.max())+1, int(ny.max())+1
+        if lo_x < x0 or lo_y < y0 or hi_x > x1 or hi_y > y1:
+            grow_x, grow_y = x1-x0, y1-y0
+            g0, h0 = max(min(lo_x, x0-grow_x), 0), max(min(lo_y, y0-grow_y), 0)
+            g1, h1 = min(max(hi_x, x1+grow_x), width), min(max(hi_y, y1+grow_y), height)
+            grown = np.zeros((g1-g0, h1-h0), dtype=bool, order='F')
+            grown[x0-g0:x1-g0, y0-h0:y1-h0] = visited
+            visited, stamp = grown, np.empty(grown.shape, dtype=np.int32, order='F')
+            x0, y0, x1, y1 = g0, h0, g1, h1
+        fresh = ~visited[nx-x0, ny-y0]
+        nx, ny = nx[fresh], ny[fresh]
+        order = np.arange(len(nx), dtype=np.int32)
+        stamp[nx-x0, ny-y0] = order
+        first = stamp[nx-x0, ny-y0] == order
+        nx, ny = nx[first], ny[first]
+        visited[nx-x0, ny-y0] = True
+        reached_x.append(nx)
+        reached_y.append(ny)
+        # Only blank tiles keep spreading, numbered ones are the border of the region
+        blank = mine_map.blank((nx, ny))
+        xs, ys = nx[blank], ny[blank]
+    xs, ys = np.concatenate(reached_x), np.concatenate(reached_y)
+    # Flagged tiles stay hidden under their flags, as with any other reveal
+    unflagged = ~mine_map.flagged[xs, ys]
+    xs, ys = xs[unflagged], ys[unflagged]
+    newly = int(np.count_nonzero(~mine_map.revealed[xs, ys]))
+    if not newly: return(0, None)
+    mine_map.revealed[xs, ys] = True
+    changed = (int(xs.min()), int(ys.min()), int(xs.max())+1, int(ys.max())+1)
+    mine_map.mark_dirty(*changed)
+    return(newly, changed)
+
+def reveal_tiles(xs, ys, mine_map):
+    """Reveal many tiles at once as clicks on each would, leaving flagged ones alone: numbered
+    tiles and bombs in one assignment, blank ones opening their regions with pop_clears. Returns
+    how many safe tiles were newly revealed and the (n, 2) bombs that were"""
+    xs, ys = np.asarray(xs, dtype=np.int64).ravel(), np.asarray(ys, dtype=np.int64).ravel()
+    if len(xs):
+        xs, ys = np.unique(np.stack([xs, ys], axis=1), axis=0).T
+    cells = np.asarray(mine_map.cells[xs, ys])
+    # Revealed tiles are done with, blank ones included as their regions are always opened whole
+    hidden = (cells & (tile_types.FLAGGED | tile_types.REVEALED)) == 0
+    xs, ys, cells = xs[hidden], ys[hidden], cells[hidden]
+    blank = (cells & tile_types.BLANK_BITS) == 0
+    single = ~blank
+    newly = int(np.count_nonzero(single & ((cells & tile_types.EXPLOSIVE) == 0)))
+    if single.any():
+        sx, sy = xs[single], ys[single]
+        mine_map.cells[sx, sy] = cells[single] | tile_types.REVEALED
+        mine_map.mark_dirty(sx.min(), sy.min(), sx.max()+1, sy.max()+1)
+    for x, y in zip(xs[blank].tolist(), ys[blank].tolist()):
+        if not mine_map.revealed[x, y]: newly += pop_clears((x, y), mine_map)
+    bombs = (cells & tile_types.EXPLOSIVE) != 0
+    return(newly, np.stack([xs[bombs], ys[bombs]], axis=1))
 
 def sum_of_bombs(tile_address, mine_map):
     """Return the sum of bombs in the adjacent squares"""
@@ -284,45 +744,6 @@ def sum_of_bombs(tile_address, mine_map):
     for x in list: count+=x
     return(count)
 
-def sum_safes(tile_address, mine_map):
-    """Return the sum of safe spaces in the adjacent squares"""
-    list = return_surrounding_types(tile_address, mine_map)
-    count = 0
-    for x in list: count += not x
-    return(count)
-
-def sum_safes_with_back_tracking(tile_address, mine_map, prev_circle):
-    """Return the sum of safe spaces in the adjacent squares, using previous info to speed things up
-    and avoid unnecessary repeat checks. Assumes that iterators go through the map per column, and 
-    that they proceed one y coordinate down at a time."""
-    if len(prev_circle) == 8:
-        for x in range(8):
-            prev_circle[x] = (prev_circle[x][0], prev_circle[x][1]+1)
-        if prev_circle[2][1] >= np.shape(mine_map.tiles)[1]:
-            prev_circle.pop(7)
-            prev_circle.pop(4)
-            prev_circle.pop(2)
-        count = 0
-        for x in prev_circle: count += not mine_map.explosive[x]
-        return(count, prev_circle)
-    else: return(sum_safes(tile_address, mine_map), return_circle_coords_old(tile_address, mine_map))
-
-def sum_bombs_with_back_tracking(tile_address, mine_map, prev_circle):
-    """Return the sum of bombs in the adjacent squares, using previous info to speed things up
-    and avoid unnecessary repeat checks. Assumes that iterators go through the map per column, and 
-    that they proceed one y coordinate down at a time."""
-    if len(prev_circle) == 8:
-        for x in range(8):
-            prev_circle[x] = (prev_circle[x][0], prev_circle[x][1]+1)
-        if prev_circle[2][1] >= np.shape(mine_map.tiles)[1]:
-            prev_circle.pop(7)
-            prev_circle.pop(4)
-            prev_circle.pop(2)
-        count = 0
-        for x in prev_circle: count += mine_map.explosive[x]
-        return(count, prev_circle)
-    else: return(sum_of_bombs(tile_address, mine_map), return_circle_coords_old(tile_address, mine_map))
-
 def check_in_bounds(tile_address, bounds):
     """Check if a specified tile_address is within the boundaries of the map"""
     if tile_address[0]>=0 and tile_address[1]>=0:
@@ -330,51 +751,47 @@ def check_in_bounds(tile_address, bounds):
             return True
     return False
 
-def reveal_squares_around_start(start_points, mine_map):
-    """Using an odd counter system for the starter point set that avoids list inefficiency for bigger sizes,
-    reveal a maybe-random clear space to start the game"""
-    trial = 0
-    for start_point in start_points:
-        cycle = 0
-        start_point = start_point
-        break
-    while not mine_map.revealed[start_point[0], start_point[1]]:
-        for start_point in start_points:
-            start_point = start_point
-            if trial == cycle:
-                trial = 0
-                cycle += 1
-                break 
-            trial += 1    
-        if cycle != 1: print(f"Previous cycle failed, onto cycle {cycle}")
-        # Occasionally pop_clears fails to reveal anything in this context, and I'm scared of the recursive 
-        # mess I made. So, repeat until it works! It works about 60% of the time on the first try, but then tends
-        # to fail repeatedly if it does fail. Not sure why, but it doesn't delay the game too much.
-        pop_clears(start_point, mine_map)
-
-def reveal_all_blanks(start_points, mine_map):
-    """Attempt to unveil every point with 0 bombs. Time-consuming, honestly just iterating to
-    reveal every tile is more helpful generally, but this does avoid revealing bombs."""
-    for start_point in start_points:
-        pop_clears(start_point, mine_map)
+def reveal_squares_around_start(start_points, mine_map, rng = random, window = None):
+    """Reveal a random clear space, along with everything it opens up, to start the game.
+    With a window, only what it opens inside a square that size around it"""
+    if len(start_points):
+        start = start_points[rng.randrange(len(start_points))]
+        if window: pop_clears_window(start, mine_map, window)
+        else: pop_clears(start, mine_map)
+
+def pop_clears_window(tile_address, mine_map, size):
+    """pop_clears cut off at a size by size square around tile_address, the same as pop_clears
+    when the region fits inside the square"""
+    # The blank region is labeled inside the square alone, so the cost stays the same however far it goes on
+    x, y = int(tile_address[0]), int(tile_address[1])
+    if not mine_map.blank((x, y)): return(0)
+    x0, y0 = max(min(x-size//2, mine_map.width-size), 0), max(min(y-size//2, mine_map.height-size), 0)
+    box = (slice(x0, min(x0+size, mine_map.width)), slice(y0, min(y0+size, mine_map.height)))
+    labels, _ = label_regions(mine_map.blank(box))
+    grown = dilate(labels == labels[x-x0, y-y0]) & ~mine_map.flagged[box]
+    newly = int(np.count_nonzero(grown & ~mine_map.revealed[box]))
+    mine_map.revealed[box] |= grown
+    mine_map.mark_dirty(x0, y0, box[0].stop, box[1].stop)
+    return(newly)
 
 def correct_char(tile_address, mine_map):
-    """Based on the explosive nature and number of nearby bombs, return the associated character"""
-    if not mine_map.explosive[tile_address]: 
-        su = sum_of_bombs(tile_address, mine_map)
+    """Based on the explosive nature and stored number of nearby bombs, return the associated character"""
+    if not mine_map.explosive[tile_address]:
+        su = int(mine_map.numbomb[tile_address])
         if not su:
             return('-')
         else: return(str(su))
     else: return('\\')
 
-def try_until_pop(map_width, map_height, mine_map):
+def try_until_pop(map_width, map_height, mine_map, rng = random, report = None, window = None):
     coord = (0, 0)
     rounds = 0
     while not mine_map.revealed[coord[0], coord[1]]:
-        coord = (random.randint(0, map_width-1), random.randint(0, map_height-1))
+        coord = (rng.randint(0, map_width-1), rng.randint(0, map_height-1))
         if not sum_of_bombs(coord, mine_map):
-            pop_clears(coord, mine_map)
+            if window: pop_clears_window(coord, mine_map, window)
+            else: pop_clears(coord, mine_map)
         rounds+=1
         if rounds>50: 
-            print('Darn, looks like something went wrong. Debug code: Try again')
+            if report: report.note('No blank start found to reveal after 50 tries')
             break
\ No newline at end of file
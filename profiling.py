@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import time
+import tracemalloc
+
+class PhaseStats:
+    """Accumulated cost of one named phase"""
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+        self.peak_memory: Optional[int] = None
+
+    def as_dict(self) -> dict:
+        return({'name': self.name, 'seconds': self.seconds, 'calls': self.calls, 'peak_memory': self.peak_memory})
+
+class GenerationReport:
+    """Records the wall time, call count and, if trace_memory is set, the tracemalloc peak of every
+    named phase run through it, and any measurements of the result in metrics. Silent unless given a
+    callback, which is called with the phase name, its seconds and its peak memory (None when not
+    traced) each time a phase finishes"""
+    def __init__(self, trace_memory: bool = False,
+        callback: Optional[Callable[[str, float, Optional[int]], None]] = None):
+        self.trace_memory, self.callback = trace_memory, callback
+        self.phases: Dict[str, PhaseStats] = {}
+        self.notes: List[str] = []
+        self.metrics: Dict[str, Any] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseStats]:
+        """Time the body of a with block as one call of the named phase"""
+        stats = self.phases.setdefault(name, PhaseStats(name))
+        tracing = self.trace_memory
+        if tracing:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing: tracemalloc.start()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            seconds = time.perf_counter()-start
+            stats.seconds += seconds
+            stats.calls += 1
+            peak = None
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                stats.peak_memory = max(stats.peak_memory or 0, peak)
+                if started_tracing: tracemalloc.stop()
+            if self.callback: self.callback(name, seconds, peak)
+
+    def note(self, message: str) -> None:
+        """Keep a message about something unusual that happened during generation"""
+        self.notes.append(message)
+
+    @property
+    def total_seconds(self) -> float:
+        return(sum(stats.seconds for stats in self.phases.values()))
+
+    def as_dict(self) -> dict:
+        return({'total_seconds': self.total_seconds, 'phases': [stats.as_dict() for stats in self.phases.values()],
+            'notes': list(self.notes), 'metrics': dict(self.metrics)})
+
+    def summary(self) -> str:
+        """Return a small table of the phases, for logs"""
+        lines = []
+        for stats in self.phases.values():
+            line = f'{stats.name:<24}{stats.seconds:>9.3f}s {stats.calls:>6} calls'
+            if stats.peak_memory is not None: line += f' {stats.peak_memory/2**20:>9.1f} MiB peak'
+            lines.append(line)
+        lines.append(f'{"total":<24}{self.total_seconds:>9.3f}s')
+        return('\n'.join(lines))
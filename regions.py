@@ -0,0 +1,87 @@
+from typing import Optional, Tuple
+import numpy as np
+
+from neighbors import dilate
+
+# Past this many tiles the label array (4 bytes a tile) is skipped and reveals fall back to flooding
+ZERO_INDEX_MAX_TILES = 5000*5000
+
+def label_regions(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Label the 8-connected regions of set tiles in mask, returning the label array (0 where unset,
+    1 up to the region count elsewhere) and each region's (x0, y0, x1, y1) bounding box, ends exclusive.
+    Works on horizontal runs of set tiles, joining runs that touch in neighboring rows"""
+    width, height = mask.shape
+    # An unset column past the edge keeps runs from wrapping onto the next row
+    padded = np.zeros((width+1, height), dtype=bool, order='F')
+    padded[:width] = mask
+    flat = padded.ravel(order='F')
+    edges = np.diff(flat.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+    starts, stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if not len(starts):
+        return(np.zeros((width, height), dtype=np.int32, order='F'), np.zeros((0, 4), dtype=np.int64))
+    # Runs of the next row touching each run, diagonals included, form a contiguous slice of runs
+    row = width+1
+    first = np.searchsorted(stops, starts+row, side='left')
+    last = np.searchsorted(starts, stops+row, side='right')
+    links = np.maximum(last-first, 0)
+    src = np.repeat(np.arange(len(starts)), links)
+    dst = first[src] + np.arange(len(src)) - np.repeat(np.cumsum(links)-links, links)
+    parent = join_runs(len(starts), src, dst)
+    roots, run_label = np.unique(parent, return_inverse=True)
+    run_label = run_label.astype(np.int32)+1
+    flat_labels = np.zeros(len(flat), dtype=np.int32)
+    flat_labels[flat] = np.repeat(run_label, stops-starts)
+    labels = np.asfortranarray(flat_labels.reshape((row, height), order='F')[:width])
+    ys, x0s, x1s = starts // row, starts % row, stops % row
+    boxes = np.empty((len(roots), 4), dtype=np.int64)
+    boxes[:, :2] = np.iinfo(np.int64).max
+    boxes[:, 2:] = 0
+    np.minimum.at(boxes[:, 0], run_label-1, x0s)
+    np.minimum.at(boxes[:, 1], run_label-1, ys)
+    np.maximum.at(boxes[:, 2], run_label-1, x1s)
+    np.maximum.at(boxes[:, 3], run_label-1, ys+1)
+    return(labels, boxes)
+
+def join_runs(count, src, dst):
+    """Union the linked pairs of runs together, returning the root run of every run"""
+    parent = np.arange(count)
+    while len(src):
+        src_root, dst_root = parent[src], parent[dst]
+        apart = src_root != dst_root
+        if not apart.any(): break
+        src, dst = src[apart], dst[apart]
+        # Hook the larger root under the smaller one, then flatten every chain back to its root
+        parent[np.maximum(src_root[apart], dst_root[apart])] = np.minimum(src_root[apart], dst_root[apart])
+        while True:
+            grand = parent[parent]
+            if (grand == parent).all(): break
+            parent = grand
+    return(parent)
+
+class ZeroRegionIndex:
+    """Every connected blank region of a finished map, labeled once after generation so that
+    revealing a region is a single masked assignment over its bounding box"""
+    def __init__(self, labels: np.ndarray, boxes: np.ndarray):
+        self.labels, self.boxes = labels, boxes
+
+    def reveal(self, tile_address, mine_map) -> Tuple[int, Optional[Tuple[int, int, int, int]]]:
+        """Reveal the blank region holding tile_address and its numbered border, leaving flagged
+        tiles hidden, returning how many tiles were newly revealed and the rectangle they are in"""
+        label = self.labels[tile_address[0], tile_address[1]]
+        # A blank tile is only ever revealed along with all of its region, bar flagged tiles
+        if not label or mine_map.revealed[tile_address[0], tile_address[1]]: return(0, None)
+        x0, y0, x1, y1 = self.boxes[label-1]
+        box = (slice(max(x0-1, 0), min(x1+1, mine_map.width)), slice(max(y0-1, 0), min(y1+1, mine_map.height)))
+        grown = dilate(self.labels[box] == label) & ~mine_map.flagged[box]
+        newly = int(np.count_nonzero(grown & ~mine_map.revealed[box]))
+        if not newly: return(0, None)
+        mine_map.revealed[box] |= grown
+        changed = (box[0].start, box[1].start, box[0].stop, box[1].stop)
+        mine_map.mark_dirty(*changed)
+        return(newly, changed)
+
+def build_zero_index(mine_map, max_tiles: int = ZERO_INDEX_MAX_TILES):
+    """Label the blank regions of a map whose numbomb values are set, or return None
+    when the map is too large for the index to be worth its memory"""
+    if mine_map.width*mine_map.height > max_tiles: return(None)
+    return(ZeroRegionIndex(*label_regions(mine_map.blank())))
@@ -0,0 +1,148 @@
+"""Recording the tile actions of a game as a compact binary log, and replaying logs without a window.
+
+A log file is MAGIC, the length and JSON text of the params of the map it was played on (the
+generate_map arguments, seed included), then one ACTION_DTYPE record of 9 bytes per action: what
+was done and to which map tile. Nothing in it depends on the window, the mouse or the camera, so
+a replay makes the map again from its seed and applies the actions straight to a GameState, as
+fast as the reveal and flag code goes.
+
+Run with `python replay.py LOG...` to replay logs and print how fast they went, or with
+--random COUNT to time COUNT random actions on a seeded map instead."""
+from __future__ import annotations
+
+from typing import Tuple
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+import procgen
+from game_map import GameMap
+from game_state import GameState
+
+MAGIC = b'MSWPLOG1'
+# What a record did, in its action field. An area reveal takes two records, one per corner, and
+# revealing all safe tiles one whose tile is ignored
+REVEAL, FLAG, CHORD, FLAG_AROUND, REVEAL_AREA, REVEAL_ALL = 1, 2, 3, 4, 5, 6
+ACTION_NAMES = {REVEAL: 'reveal', FLAG: 'flag', CHORD: 'chord', FLAG_AROUND: 'flag around',
+    REVEAL_AREA: 'reveal area', REVEAL_ALL: 'reveal all safe'}
+# Records each action takes
+ACTION_RECORDS = {REVEAL_AREA: 2}
+# Actions a game still takes once it is over
+AFTER_GAME = {REVEAL_ALL}
+ACTION_DTYPE = np.dtype([('action', 'u1'), ('x', '<u4'), ('y', '<u4')])
+# The generate_map arguments a log's params are made again with
+MAP_PARAMS = ('map_width', 'map_height', 'desired_bomb_percent', 'playable', 'generator', 'seed', 'no_guess')
+
+def apply(state: GameState, action: int, *tiles: Tuple[int, int]) -> None:
+    """Perform one logged action on a game, given the tiles of its records"""
+    (x, y) = tile = tiles[0]
+    if action == REVEAL: state.reveal(tile)
+    elif action == FLAG: state.toggle_flag(tile)
+    elif action == CHORD: state.chord([x], [y])
+    elif action == FLAG_AROUND: state.flag_around([x], [y])
+    elif action == REVEAL_AREA: state.reveal_area(x, y, tiles[1][0]+1, tiles[1][1]+1)
+    elif action == REVEAL_ALL: state.reveal_all_safe()
+    else: raise ValueError(f'Unknown action {action}')
+
+def header(params: dict) -> bytes:
+    text = json.dumps(params).encode()
+    return(MAGIC+struct.pack('<I', len(text))+text)
+
+class ActionLog:
+    """A log being written as a game is played, each action going straight to the file so a
+    crash or a killed game still leaves everything up to it"""
+    def __init__(self, path: str, params: dict):
+        self.path, self.count = path, 0
+        self.file = open(path, 'wb')
+        self.file.write(header(params))
+        self.file.flush()
+
+    def append(self, action: int, *tiles: Tuple[int, int]) -> None:
+        """Write an action and its tiles, one record per tile"""
+        self.file.write(np.array([(action, x, y) for x, y in tiles], dtype=ACTION_DTYPE).tobytes())
+        self.file.flush()
+        self.count += 1
+
+    def close(self) -> None:
+        self.file.close()
+
+def write_log(path: str, params: dict, actions: np.ndarray) -> None:
+    """Write a whole log at once from an array of ACTION_DTYPE records"""
+    with open(path, 'wb') as file:
+        file.write(header(params))
+        np.ascontiguousarray(actions, dtype=ACTION_DTYPE).tofile(file)
+
+def read_log(path: str, mmap: bool = True) -> Tuple[dict, np.ndarray]:
+    """Return the params and ACTION_DTYPE records of a log, the records memory-mapped unless mmap is off"""
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC: raise ValueError(f'{path} is not an action log')
+        length, = struct.unpack('<I', file.read(4))
+        params = json.loads(file.read(length))
+        offset = file.tell()
+        if not mmap: return(params, np.fromfile(file, dtype=ACTION_DTYPE))
+    # A memmap of nothing is an error, and a log can be empty when the game was closed straight away
+    if offset == os.path.getsize(path): return(params, np.empty(0, dtype=ACTION_DTYPE))
+    return(params, np.memmap(path, dtype=ACTION_DTYPE, mode='r', offset=offset))
+
+def map_for(params: dict) -> GameMap:
+    """Make the map a log was played on again from its params"""
+    if params.get('seed') is None: raise ValueError("The log's map was not generated from a seed, so it cannot be made again")
+    return(procgen.generate_map(**{name: params[name] for name in MAP_PARAMS if name in params}))
+
+def replay(actions: np.ndarray, mine_map: GameMap, stop_when_over: bool = True) -> Tuple[GameState, int]:
+    """Apply logged actions to a fresh game on mine_map, returning its GameState and how many
+    records were applied, which is fewer than given when the game ended first and stop_when_over
+    (apart from AFTER_GAME actions)"""
+    state = GameState(mine_map)
+    applied, tiles = 0, []
+    # Plain ints are far cheaper to index the map with than numpy scalars
+    for action, x, y in zip(actions['action'].tolist(), actions['x'].tolist(), actions['y'].tolist()):
+        if stop_when_over and state.over and action not in AFTER_GAME: break
+        applied += 1
+        tiles.append((x, y))
+        if len(tiles) < ACTION_RECORDS.get(action, 1): continue
+        apply(state, action, *tiles)
+        tiles = []
+    return(state, applied)
+
+def random_actions(mine_map: GameMap, count: int, seed = None, flag_share: float = 0.2, chord_share: float = 0.1) -> np.ndarray:
+    """count random reveals, flags and chords spread over mine_map, for timing replays of any length"""
+    rng = np.random.default_rng(seed)
+    actions = np.empty(count, dtype=ACTION_DTYPE)
+    draw = rng.random(count)
+    actions['action'] = np.where(draw < flag_share, FLAG, np.where(draw < flag_share+chord_share, CHORD, REVEAL))
+    actions['x'] = rng.integers(0, mine_map.width, count)
+    actions['y'] = rng.integers(0, mine_map.height, count)
+    return(actions)
+
+def timed_replay(actions: np.ndarray, mine_map: GameMap, stop_when_over: bool = True) -> dict:
+    start = time.perf_counter()
+    state, applied = replay(actions, mine_map, stop_when_over)
+    seconds = time.perf_counter()-start
+    return({'actions': len(actions), 'applied': applied, 'seconds': seconds,
+        'actions_per_second': applied/seconds if seconds else None, 'status': state.status,
+        'safe_remaining': state.safe_remaining, 'flags': state.flags})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('logs', nargs='*', help='action logs to replay')
+    parser.add_argument('--random', type=int, metavar='COUNT', help='replay COUNT random actions instead')
+    parser.add_argument('--size', type=int, default=500, help='map side length for --random')
+    parser.add_argument('--seed', type=int, default=1234, help='map and action seed for --random')
+    parser.add_argument('--keep-going', action='store_true', help='apply every action even after the game ends')
+    args = parser.parse_args(argv)
+    if args.random:
+        mine_map = procgen.generate_map(args.size, args.size, 25, True, generator='batched', seed=args.seed)
+        actions = random_actions(mine_map, args.random, args.seed)
+        print(json.dumps({'log': None, **timed_replay(actions, mine_map, not args.keep_going)}), flush=True)
+    for path in args.logs:
+        params, actions = read_log(path)
+        print(json.dumps({'log': path, **timed_replay(actions, map_for(params), not args.keep_going)}), flush=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,297 @@
+"""An asyncio server hosting many games at once over a local socket, for bots and remote players.
+
+Every message either way is a frame: the length of its body as a little-endian u4, then the
+body. A request body is an op byte followed by the op's fields, all little-endian:
+
+    NEW_GAME  a JSON object of generate_map arguments (replay.MAP_PARAMS), plus keep_going to
+              let actions carry on after the game is lost
+    ACTION    <u4 session> <u1 action> and <u4 x> <u4 y> per record, with replay's action codes
+    VIEW      <u4 session> <u4 x0> <u4 y0> <u4 x1> <u4 y1>, the ends exclusive
+    CLOSE     <u4 session>
+
+A response body is OK and the op's answer, or ERROR and a UTF-8 message. NEW_GAME answers with
+<u4 session> <u4 width> <u4 height>, ACTION with the game's STATUS and VIEW with the STATUS and
+what the player sees of the viewport, in which hidden tiles show only whether they are flagged.
+The first fetch of a viewport, or of a different one, sends FULL, the viewport as cut to the
+map and all its bytes column by column; later fetches send DIFF, a <u4 count> and count
+VIEW_DTYPE records of the tiles changed since. Maps are generated in worker processes, so the
+event loop never waits on one.
+
+Run `python server.py serve` to listen, or `python server.py load` for a load test printing
+requests per second and latency percentiles, against a server it starts itself unless given
+--port or --unix."""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Dict, List, Optional, Tuple, Union
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+import procgen
+import tile_types
+from game_state import GameState, LOST, PLAYING, WON
+from replay import ACTION_RECORDS, AFTER_GAME, CHORD, FLAG, MAP_PARAMS, REVEAL, apply
+
+NEW_GAME, ACTION, VIEW, CLOSE = 1, 2, 3, 4
+OK, ERROR = 0, 1
+FULL, DIFF = 0, 1
+FRAME = struct.Struct('<I')
+SESSION = struct.Struct('<I')
+# The number of VIEW_DTYPE records in a DIFF
+COUNT = struct.Struct('<I')
+TILE = struct.Struct('<II')
+RECT = struct.Struct('<IIII')
+# The game's status code, the safe tiles still hidden and the flags placed
+STATUS = struct.Struct('<BII')
+STATUS_CODES = {PLAYING: 0, WON: 1, LOST: 2}
+VIEW_DTYPE = np.dtype([('x', '<u4'), ('y', '<u4'), ('cell', 'u1')])
+DEFAULT_PORT = 7770
+# Requests longer than this close the connection, and bigger maps and viewports are refused
+MAX_REQUEST = 1 << 16
+MAX_MAP_TILES = 5000*5000
+MAX_VIEW_TILES = 1000*1000
+# Side length of the viewports the load test fetches
+LOAD_VIEW = 100
+
+Address = Union[str, Tuple[str, int]]
+
+def visible(cells: np.ndarray) -> np.ndarray:
+    """What the player sees of cells: revealed tiles whole, hidden ones only their flag"""
+    return(np.where(cells & tile_types.REVEALED, cells, cells & tile_types.FLAGGED))
+
+class Session:
+    """One game on the server and the viewport last sent of it"""
+    def __init__(self, mine_map, stop_when_over: bool = True):
+        self.state = GameState(mine_map)
+        self.stop_when_over = stop_when_over
+        self.view: Optional[Tuple[int, int, int, int]] = None
+        self.sent: Optional[np.ndarray] = None
+
+    def act(self, action: int, tiles: List[Tuple[int, int]]) -> None:
+        mine_map, state = self.state.mine_map, self.state
+        for x, y in tiles:
+            if x >= mine_map.width or y >= mine_map.height: raise ValueError(f'Tile {(x, y)} is off the map')
+        if action in AFTER_GAME and not state.over: raise ValueError('That action is only allowed once the game is over')
+        if self.stop_when_over and state.over and action not in AFTER_GAME: return
+        apply(state, action, *tiles)
+
+    def status(self) -> bytes:
+        state = self.state
+        return(STATUS.pack(STATUS_CODES[state.status], state.safe_remaining, state.flags))
+
+    def fetch(self, x0: int, y0: int, x1: int, y1: int) -> bytes:
+        """The visible viewport in full if it is new, otherwise the tiles changed since it was last sent"""
+        mine_map = self.state.mine_map
+        x1, y1 = min(x1, mine_map.width), min(y1, mine_map.height)
+        if x0 >= x1 or y0 >= y1 or (x1-x0)*(y1-y0) > MAX_VIEW_TILES: raise ValueError(f'Bad viewport {(x0, y0, x1, y1)}')
+        seen = visible(mine_map.cells[x0:x1, y0:y1])
+        if (x0, y0, x1, y1) != self.view:
+            self.view, self.sent = (x0, y0, x1, y1), seen
+            return(bytes((FULL,))+RECT.pack(*self.view)+seen.tobytes(order='F'))
+        xs, ys = np.nonzero(seen != self.sent)
+        self.sent = seen
+        changes = np.empty(len(xs), dtype=VIEW_DTYPE)
+        changes['x'], changes['y'], changes['cell'] = xs+x0, ys+y0, seen[xs, ys]
+        return(bytes((DIFF,))+COUNT.pack(len(xs))+changes.tobytes())
+
+class GameServer:
+    """Sessions by id, served to any number of connections. Each request is answered in full
+    before the connection's next one is read, and maps are made in a pool of worker processes"""
+    def __init__(self, workers: Optional[int] = None):
+        self.sessions: Dict[int, Session] = {}
+        self.next_session = 1
+        self.workers = workers or max(1, (os.cpu_count() or 1)-1)
+        self.executor = self.make_executor()
+
+    def make_executor(self) -> ProcessPoolExecutor:
+        # Spawned like pregen's workers, and as the core does not import tcod they start quickly
+        return(ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')))
+
+    async def new_game(self, body: bytes) -> bytes:
+        params = json.loads(body)
+        stop_when_over = not params.pop('keep_going', False)
+        unknown = set(params)-set(MAP_PARAMS)
+        if unknown: raise ValueError(f'Unknown map params {sorted(unknown)}')
+        if params.get('map_width', 0)*params.get('map_height', 0) > MAX_MAP_TILES: raise ValueError('Map too large')
+        executor = self.executor
+        try: mine_map = await asyncio.get_running_loop().run_in_executor(executor, partial(procgen.generate_map, **params))
+        except BrokenProcessPool:
+            # A worker died, so the pool takes no more work: replace it unless another request already has
+            if self.executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self.make_executor()
+            raise
+        session, self.next_session = self.next_session, self.next_session+1
+        self.sessions[session] = Session(mine_map, stop_when_over)
+        return(SESSION.pack(session)+TILE.pack(mine_map.width, mine_map.height))
+
+    async def handle(self, body: bytes) -> bytes:
+        """Carry out one request, returning the answer to send after OK"""
+        op, body = body[0], body[1:]
+        if op == NEW_GAME: return(await self.new_game(body))
+        session_id, = SESSION.unpack_from(body)
+        session = self.sessions.get(session_id)
+        if session is None: raise ValueError(f'Unknown session {session_id}')
+        if op == ACTION:
+            action = body[SESSION.size]
+            start = SESSION.size+1
+            tiles = [TILE.unpack_from(body, start+i*TILE.size) for i in range(ACTION_RECORDS.get(action, 1))]
+            session.act(action, tiles)
+            return(session.status())
+        if op == VIEW: return(session.status()+session.fetch(*RECT.unpack_from(body, SESSION.size)))
+        if op == CLOSE:
+            del self.sessions[session_id]
+            return(b'')
+        raise ValueError(f'Unknown op {op}')
+
+    async def connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try: length, = FRAME.unpack(await reader.readexactly(FRAME.size))
+                except asyncio.IncompleteReadError: break
+                if length > MAX_REQUEST: break
+                body = await reader.readexactly(length)
+                try: reply = bytes((OK,))+await self.handle(body)
+                except (ValueError, TypeError, IndexError, RuntimeError, struct.error) as error: reply = bytes((ERROR,))+str(error).encode()
+                writer.write(FRAME.pack(len(reply))+reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError): pass
+        finally: writer.close()
+
+    async def listen(self, address: Address) -> asyncio.AbstractServer:
+        """Start serving on a Unix socket path or a (host, port) pair"""
+        if isinstance(address, str): return(await asyncio.start_unix_server(self.connection, address))
+        return(await asyncio.start_server(self.connection, *address))
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class Client:
+    """A connection to a GameServer, sending one request at a time"""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader, self.writer = reader, writer
+
+    @classmethod
+    async def connect(cls, address: Address) -> Client:
+        if isinstance(address, str): return(cls(*await asyncio.open_unix_connection(address)))
+        return(cls(*await asyncio.open_connection(*address)))
+
+    async def request(self, op: int, body: bytes = b'') -> bytes:
+        """Send a request and return its answer, raising ValueError with the server's message on an error"""
+        self.writer.write(FRAME.pack(len(body)+1)+bytes((op,))+body)
+        length, = FRAME.unpack(await self.reader.readexactly(FRAME.size))
+        reply = await self.reader.readexactly(length)
+        if reply[0] != OK: raise ValueError(reply[1:].decode())
+        return(reply[1:])
+
+    async def new_game(self, **params) -> Tuple[int, int, int]:
+        """Start a game on a map made from generate_map's params, returning its session, width and height"""
+        reply = await self.request(NEW_GAME, json.dumps(params).encode())
+        return(SESSION.unpack_from(reply)+TILE.unpack_from(reply, SESSION.size))
+
+    async def act(self, session: int, action: int, *tiles: Tuple[int, int]) -> Tuple[int, int, int]:
+        """Perform an action, returning the game's status code, safe tiles hidden and flags placed"""
+        body = SESSION.pack(session)+bytes((action,))+b''.join(TILE.pack(x, y) for x, y in tiles)
+        return(STATUS.unpack(await self.request(ACTION, body)))
+
+    async def view(self, session: int, x0: int, y0: int, x1: int, y1: int) -> Tuple[Tuple[int, int, int], int, np.ndarray]:
+        """The game's status, and FULL with the visible cells of the viewport (cut to the map) or
+        DIFF with VIEW_DTYPE records of those changed since the last fetch"""
+        reply = await self.request(VIEW, SESSION.pack(session)+RECT.pack(x0, y0, x1, y1))
+        status, kind = STATUS.unpack_from(reply), reply[STATUS.size]
+        data = memoryview(reply)[STATUS.size+1:]
+        if kind == FULL:
+            x0, y0, x1, y1 = RECT.unpack_from(data)
+            return(status, kind, np.frombuffer(data, dtype=np.uint8, offset=RECT.size).reshape((x1-x0, y1-y0), order='F'))
+        count, = COUNT.unpack_from(data)
+        return(status, kind, np.frombuffer(data, dtype=VIEW_DTYPE, count=count, offset=COUNT.size))
+
+    async def close_game(self, session: int) -> None:
+        await self.request(CLOSE, SESSION.pack(session))
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def load_test(address: Address, games: int = 8, actions: int = 2000, size: int = 200,
+        seed: int = 1234, view_every: int = 10) -> dict:
+    """games clients at once, each on its own connection and game, sending actions random
+    reveals, flags and chords and fetching the viewport around its last tile every view_every
+    of them. The games keep going after a bomb, so every action does work. Latencies are per
+    request, from sending it to having its answer"""
+    async def start(number):
+        client = await Client.connect(address)
+        session, width, height = await client.new_game(map_width=size, map_height=size,
+            desired_bomb_percent=25, playable=True, generator='batched', seed=seed+number, keep_going=True)
+        return(client, session, width, height)
+    players = await asyncio.gather(*(start(number) for number in range(games)))
+    latencies: List[float] = []
+    async def play(number, client, session, width, height):
+        rng = np.random.default_rng(seed+number)
+        kinds = rng.choice([REVEAL, FLAG, CHORD], actions, p=[0.7, 0.2, 0.1]).tolist()
+        tiles = rng.integers(0, (width, height), (actions, 2)).tolist()
+        for step, (kind, (x, y)) in enumerate(zip(kinds, tiles)):
+            begin = time.perf_counter()
+            if step % view_every: await client.act(session, kind, (x, y))
+            else:
+                x0, y0 = max(0, x-LOAD_VIEW//2), max(0, y-LOAD_VIEW//2)
+                await client.view(session, x0, y0, x0+LOAD_VIEW, y0+LOAD_VIEW)
+            latencies.append(time.perf_counter()-begin)
+    start_time = time.perf_counter()
+    await asyncio.gather(*(play(number, *player) for number, player in enumerate(players)))
+    seconds = time.perf_counter()-start_time
+    for client, session, *_ in players:
+        await client.close_game(session)
+        await client.close()
+    milliseconds = np.array(latencies)*1000
+    return({'games': games, 'requests': len(latencies), 'seconds': seconds,
+        'requests_per_second': len(latencies)/seconds, 'p50_ms': float(np.percentile(milliseconds, 50)),
+        'p99_ms': float(np.percentile(milliseconds, 99)), 'max_ms': float(milliseconds.max())})
+
+async def run_load_test(address: Optional[Address], workers: Optional[int] = None, **options) -> dict:
+    """load_test against address, or against a server started here on a free local port"""
+    if address is not None: return(await load_test(address, **options))
+    server = GameServer(workers)
+    listener = await server.listen(('127.0.0.1', 0))
+    try: return(await load_test(listener.sockets[0].getsockname()[:2], **options))
+    finally:
+        listener.close()
+        server.close()
+
+async def serve(address: Address, workers: Optional[int] = None) -> None:
+    server = GameServer(workers)
+    listener = await server.listen(address)
+    print(f'Serving on {address}', flush=True)
+    try:
+        async with listener: await listener.serve_forever()
+    finally: server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mode', choices=['serve', 'load'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help=f'TCP port, {DEFAULT_PORT} when serving by default')
+    parser.add_argument('--unix', metavar='PATH', help='serve on or connect to a Unix socket instead')
+    parser.add_argument('--workers', type=int, help='map generation processes')
+    parser.add_argument('--games', type=int, default=8, help='games played at once in the load test')
+    parser.add_argument('--actions', type=int, default=2000, help='requests per game in the load test')
+    parser.add_argument('--size', type=int, default=200, help='map side length in the load test')
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+    address = args.unix or ((args.host, args.port) if args.port else None)
+    if args.mode == 'serve': asyncio.run(serve(address or (args.host, DEFAULT_PORT), args.workers))
+    else: print(json.dumps(asyncio.run(run_load_test(address, args.workers, games=args.games,
+        actions=args.actions, size=args.size, seed=args.seed))), flush=True)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,482 @@
+"""Working out which hidden tiles of a map are certainly safe or certainly bombs from what is revealed.
+
+A Solver only looks at revealed numbers, never at the hidden truth. Its cheapest rule runs as whole
+array operations over a window of the map: a number whose bombs are all accounted for makes its
+other hidden neighbors safe, and one with as many hidden neighbors as bombs left makes them all
+bombs. When that runs dry it compares pairs of overlapping numbers, and then tries every
+arrangement of bombs over small groups of hidden tiles along the frontier. Work is tracked per
+block of the map, so after a reveal only the blocks around what changed are looked at again.
+
+make_solvable uses a Solver to turn a generated map into one that never needs a guess."""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import random
+import numpy as np
+
+import procgen
+import tile_types
+from neighbors import adjacent_coords, circ_coords, count_adjacent, dilate, dilate_square, min_square
+from profiling import GenerationReport
+from regions import build_zero_index
+
+# Side of the square blocks the solver tracks which parts of the map need another look in
+SOLVER_BLOCK = 64
+# Farthest a stuck bomb is looked for from the hidden safe tiles it keeps from being solved
+REPAIR_REACH = 32
+# At most one stuck bomb is moved per square of this side in each round of repairs
+REPAIR_SPACING = 8
+# Most hidden tiles in one group for trying every arrangement of bombs over them
+ENUMERATION_LIMIT = 14
+# The step of tiles the solver has not proven or revealed
+UNPROVEN = np.iinfo(np.int32).max
+# How each known tile came to be known, as kept in Solver.proven_by
+REASONS = ('start', 'simple', 'pairs', 'enumeration', 'opened')
+
+class Solver:
+    """Deduces safe tiles and bombs on mine_map. mine and safe hold what has been proven so far
+    (safe only until the tile is revealed), and stats how many tiles each kind of reasoning proved.
+    With reveals, safe tiles are revealed on the map as soon as they are proven, so what they
+    show is used within the same deduce. proven_at and proven_by hold the step each known tile was
+    proven or revealed in and the index in REASONS of how, so findings can be rolled back"""
+    def __init__(self, mine_map, block: int = SOLVER_BLOCK, enumeration_limit: int = ENUMERATION_LIMIT, reveals: bool = False):
+        self.mine_map, self.block, self.enumeration_limit, self.reveals = mine_map, block, enumeration_limit, reveals
+        # Tiles revealed by the solver itself
+        self.revealed = 0
+        width, height = mine_map.width, mine_map.height
+        self.mine = np.zeros((width, height), dtype=bool, order='F')
+        self.safe = np.zeros((width, height), dtype=bool, order='F')
+        self.blocks_x, self.blocks_y = -(-width//block), -(-height//block)
+        # Blocks whose numbers may allow a simple deduction, and blocks looked at since the last deeper pass
+        self.pending = np.ones((self.blocks_x, self.blocks_y), dtype=bool)
+        self.unsettled = np.zeros((self.blocks_x, self.blocks_y), dtype=bool)
+        self.stats = {'simple': 0, 'pairs': 0, 'enumeration': 0}
+        self.found_safe: List[np.ndarray] = []
+        self.found_mine: List[np.ndarray] = []
+        self.step = 0
+        self.proven_at = np.where(mine_map.revealed[...], 0, UNPROVEN).astype(np.int32)
+        self.proven_by = np.zeros((width, height), dtype=np.uint8, order='F')
+        # From which step on what is found near each tile may not follow from the numbers any more
+        self.doubted_at = np.full((width, height), UNPROVEN, dtype=np.int32, order='F')
+
+    def notice(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        """Note that tiles in a rectangle (ends exclusive) changed, so the numbers in and around it
+        are looked at again by the next deduce"""
+        size = self.block
+        bx0, by0 = max(int(x0)-1, 0)//size, max(int(y0)-1, 0)//size
+        bx1, by1 = min(int(x1)+1, self.mine_map.width)-1, min(int(y1)+1, self.mine_map.height)-1
+        self.pending[bx0:bx1//size+1, by0:by1//size+1] = True
+
+    def notice_tiles(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """notice for a scatter of single tiles"""
+        size = self.block
+        # The tiles one either side are enough, a block is never narrower than 3
+        for bx in (np.maximum(xs-1, 0)//size, np.minimum(xs+1, self.mine_map.width-1)//size):
+            for by in (np.maximum(ys-1, 0)//size, np.minimum(ys+1, self.mine_map.height-1)//size):
+                self.pending[bx, by] = True
+
+    def deduce(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the tiles newly proven safe and newly proven to be bombs, as (n, 2) arrays.
+        The simple rule is run until nothing changes; only if it found nothing are the
+        pair and enumeration passes tried, over the blocks it looked at"""
+        self.found_safe, self.found_mine = [], []
+        while self.pending.any():
+            for window in self.windows(self.pending):
+                self.simple_pass(*window)
+        if not self.found_safe and not self.found_mine and self.unsettled.any():
+            blocks = self.unsettled.copy()
+            windows = self.windows(blocks)
+            self.unsettled[:] = False
+            # Groups the pairs left unenumerated are tried again once they stop finding anything
+            if self.deeper_pass(windows) == 'pairs': self.unsettled |= blocks
+        empty = np.empty((0, 2), dtype=np.int64)
+        return(np.concatenate(self.found_safe) if self.found_safe else empty,
+            np.concatenate(self.found_mine) if self.found_mine else empty)
+
+    def windows(self, blocks: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """The tile rectangles covered by the set blocks, a run of blocks in the same row of blocks
+        becoming one rectangle, after which the blocks are cleared from pending and set in unsettled"""
+        size, width, height = self.block, self.mine_map.width, self.mine_map.height
+        padded = np.zeros((blocks.shape[0]+2, blocks.shape[1]), dtype=bool)
+        padded[1:-1] = blocks
+        starts = np.argwhere((padded[1:-1] & ~padded[:-2]).T)
+        ends = np.argwhere((padded[1:-1] & ~padded[2:]).T)
+        self.unsettled |= blocks
+        self.pending &= ~blocks
+        return([(bx0*size, by*size, min((bx1+1)*size, width), min((by+1)*size, height))
+            for (by, bx0), (_, bx1) in zip(starts.tolist(), ends.tolist())])
+
+    def window_state(self, x0, y0, x1, y1):
+        """Read a window of the map with a border of 2 tiles, returning the border's offset, which
+        tiles are still unknown, the bombs left around each number and how many unknowns it touches,
+        and the numbers inside the window that still touch unknown tiles"""
+        rx0, ry0 = max(x0-2, 0), max(y0-2, 0)
+        rx1, ry1 = min(x1+2, self.mine_map.width), min(y1+2, self.mine_map.height)
+        region = (slice(rx0, rx1), slice(ry0, ry1))
+        cells = np.asarray(self.mine_map.cells[region])
+        revealed = (cells & tile_types.REVEALED) != 0
+        unknown = ~revealed & ~self.mine[region] & ~self.safe[region]
+        left = (cells & tile_types.NUMBOMB).astype(np.int16)-count_adjacent(self.mine[region])
+        touching = count_adjacent(unknown).astype(np.int16)
+        active = np.zeros(cells.shape, dtype=bool, order='F')
+        active[x0-rx0:x1-rx0, y0-ry0:y1-ry0] = True
+        active &= revealed & ((cells & tile_types.EXPLOSIVE) == 0) & (touching > 0)
+        return((rx0, ry0), unknown, left, touching, active)
+
+    def simple_pass(self, x0, y0, x1, y1) -> None:
+        """Apply the single number rules to the numbers in a window until they prove nothing more"""
+        while True:
+            (rx0, ry0), unknown, left, touching, active = self.window_state(x0, y0, x1, y1)
+            if not active.any(): break
+            to_safe = dilate(active & (left == 0)) & unknown
+            to_mine = dilate(active & (left == touching)) & unknown & ~to_safe
+            if not to_safe.any() and not to_mine.any(): break
+            self.prove(np.argwhere(to_safe)+(rx0, ry0), np.argwhere(to_mine)+(rx0, ry0), 'simple')
+        # Whatever changed inside the window has been seen to already
+        size = self.block
+        self.pending[x0//size:-(-x1//size), y0//size:-(-y1//size)] = False
+
+    def prove(self, safe: np.ndarray, mines: np.ndarray, how: str) -> None:
+        """Record tiles as proven, revealing the safe ones if the solver reveals, and queue the
+        numbers around them for another look"""
+        safe, mines = safe.reshape(-1, 2), mines.reshape(-1, 2)
+        safe = safe[~self.safe[safe[:, 0], safe[:, 1]]]
+        mines = mines[~self.mine[mines[:, 0], mines[:, 1]]]
+        self.step += 1
+        self.safe[safe[:, 0], safe[:, 1]] = True
+        self.mine[mines[:, 0], mines[:, 1]] = True
+        for tiles in (safe, mines):
+            self.proven_at[tiles[:, 0], tiles[:, 1]] = self.step
+            self.proven_by[tiles[:, 0], tiles[:, 1]] = REASONS.index(how)
+        for found, tiles in ((self.found_safe, safe), (self.found_mine, mines)):
+            if len(tiles):
+                found.append(tiles)
+                self.notice_tiles(tiles[:, 0], tiles[:, 1])
+        self.stats[how] += len(safe)+len(mines)
+        if self.reveals and len(safe): self.revealed += self.reveal(safe)
+
+    def constraints(self, windows) -> List[Tuple[Tuple[int, ...], int]]:
+        """The numbers in the windows that touch unknown tiles, each as the sorted flat indexes
+        (x + y*width) of those unknown tiles and how many bombs are among them"""
+        width = self.mine_map.width
+        found: Dict[int, Tuple[Tuple[int, ...], int]] = {}
+        for x0, y0, x1, y1 in windows:
+            (rx0, ry0), unknown, left, touching, active = self.window_state(x0, y0, x1, y1)
+            xs, ys = np.nonzero(active)
+            if not len(xs): continue
+            ids = np.full((len(xs), 8), -1, dtype=np.int64)
+            for k, (dx, dy) in enumerate(circ_coords):
+                nx, ny = xs+dx, ys+dy
+                fits = (nx >= 0) & (ny >= 0) & (nx < unknown.shape[0]) & (ny < unknown.shape[1])
+                hit = np.zeros(len(xs), dtype=bool)
+                hit[fits] = unknown[nx[fits], ny[fits]]
+                ids[hit, k] = (nx[hit]+rx0)+(ny[hit]+ry0).astype(np.int64)*width
+            tiles = (xs+rx0)+(ys+ry0).astype(np.int64)*width
+            for tile, row, bombs in zip(tiles.tolist(), ids.tolist(), left[xs, ys].tolist()):
+                found[tile] = (tuple(sorted(v for v in row if v >= 0)), bombs)
+        return([found[tile] for tile in sorted(found)])
+
+    def deeper_pass(self, windows) -> Optional[str]:
+        """Compare overlapping pairs of numbers, and failing that enumerate small groups,
+        returning which of the two proved anything"""
+        constraints = self.constraints(windows)
+        if not constraints: return(None)
+        safe, mines = pair_rule(constraints)
+        how = 'pairs'
+        if not safe and not mines:
+            safe, mines = enumerate_groups(constraints, self.enumeration_limit)
+            how = 'enumeration'
+        width = self.mine_map.width
+        as_tiles = lambda flat: np.array([(v%width, v//width) for v in sorted(flat)], dtype=np.int64).reshape(-1, 2)
+        if not safe and not mines: return(None)
+        self.prove(as_tiles(safe), as_tiles(mines), how)
+        return(how)
+
+    def reveal(self, tiles: np.ndarray) -> int:
+        """Reveal proven safe tiles on the map, opening blank ones with pop_clears, and queue
+        whatever changed for the next deduce. Returns how many tiles were newly revealed"""
+        mine_map = self.mine_map
+        tiles = tiles.reshape(-1, 2)
+        tiles = tiles[~mine_map.revealed[tiles[:, 0], tiles[:, 1]]]
+        if not len(tiles): return(0)
+        blank = mine_map.blank((tiles[:, 0], tiles[:, 1]))
+        numbered = tiles[~blank]
+        newly = len(numbered)
+        if newly:
+            mine_map.revealed[numbered[:, 0], numbered[:, 1]] = True
+            mine_map.mark_dirty(*numbered.min(axis=0), *(numbered.max(axis=0)+1))
+            self.notice_tiles(numbered[:, 0], numbered[:, 1])
+        for tile in tiles[blank]:
+            if mine_map.revealed[tile[0], tile[1]]: continue
+            opened, changed = procgen.pop_clears_bounds(tile, mine_map)
+            newly += opened
+            if changed is None: continue
+            self.notice(*changed)
+            box = (slice(changed[0], changed[2]), slice(changed[1], changed[3]))
+            fresh = mine_map.revealed[box] & (self.proven_at[box] == UNPROVEN)
+            self.proven_at[box][fresh] = self.step
+            self.proven_by[box][fresh] = REASONS.index('opened')
+        return(newly)
+
+    def doubt(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """Note that the tiles at xs, ys changed: whatever was found after them from what they
+        showed or were proven to be is in doubt, and bombs proven there that are gone are forgotten"""
+        self.doubted_at[xs, ys] = np.minimum(self.doubted_at[xs, ys], self.proven_at[xs, ys])
+        gone = self.mine[xs, ys] & ~self.mine_map.explosive[xs, ys]
+        self.mine[xs[gone], ys[gone]] = False
+        self.proven_at[xs[gone], ys[gone]] = UNPROVEN
+
+    def doubtful(self) -> np.ndarray:
+        """The known tiles that may have been found from doubted ones, directly or through others"""
+        # A finding's reasons lie within this many tiles of it: the numbers around it and what is
+        # known around them, for pairs two numbers apart, and for enumeration its whole group
+        reach = {REASONS.index('simple'): 2, REASONS.index('pairs'): 4, REASONS.index('enumeration'): 2*self.enumeration_limit+4}
+        opened = self.proven_by == REASONS.index('opened')
+        known = self.proven_at < UNPROVEN
+        doubtful = np.zeros(known.shape, dtype=bool, order='F')
+        since = self.doubted_at
+        while True:
+            found = np.zeros(known.shape, dtype=bool, order='F')
+            for reason, radius in reach.items():
+                found |= (self.proven_by == reason) & (self.proven_at > min_square(since, radius))
+            found &= known & ~doubtful
+            # A blank region is opened whole, so it is in doubt with whatever opened it
+            found |= opened & ~doubtful & np.isin(self.proven_at, np.unique(self.proven_at[found]))
+            if not found.any(): return(doubtful)
+            doubtful |= found
+            since = np.minimum(since, np.where(found, self.proven_at, UNPROVEN))
+
+    def rollback(self) -> bool:
+        """Forget whatever may have been found from doubted tiles, hiding again the tiles it revealed,
+        so what is left follows from the numbers as they are. Returns whether anything was in doubt"""
+        if (self.doubted_at == UNPROVEN).all(): return(False)
+        forget = self.doubtful()
+        self.mine &= ~forget
+        self.safe &= ~forget
+        self.mine_map.revealed[...] = self.mine_map.revealed[...] & ~forget
+        self.proven_at[forget] = UNPROVEN
+        self.doubted_at[:] = UNPROVEN
+        self.pending[:] = True
+        self.unsettled[:] = False
+        return(True)
+
+def pair_rule(constraints) -> Tuple[set, set]:
+    """For every two numbers sharing unknown tiles A and B: if B has exactly as many more bombs
+    than A as it has tiles A lacks, those tiles are bombs and A's tiles that B lacks are safe"""
+    sets = [frozenset(tiles) for tiles, _ in constraints]
+    by_tile = defaultdict(list)
+    for i, tiles in enumerate(sets):
+        for tile in tiles: by_tile[tile].append(i)
+    safe, mines = set(), set()
+    for i, a in enumerate(sets):
+        bombs_a = constraints[i][1]
+        for j in {j for tile in a for j in by_tile[tile]}:
+            if j == i: continue
+            b, bombs_b = sets[j], constraints[j][1]
+            # With B inside A this is the subset rule the other way round: B's bombs are all
+            # of A's, so the rest of A is safe
+            only_b = b-a
+            if bombs_b-bombs_a == len(only_b):
+                mines |= only_b
+                safe |= a-b
+    return(safe-mines, mines)
+
+def enumerate_groups(constraints, limit: int) -> Tuple[set, set]:
+    """Try every arrangement of bombs over each connected group of unknown tiles with at most limit
+    tiles, and around each number over it and the numbers it overlaps when its group is bigger.
+    Tiles empty or bombed in every arrangement that fits the numbers are proven"""
+    by_tile = defaultdict(list)
+    for i, (tiles, _) in enumerate(constraints):
+        for tile in tiles: by_tile[tile].append(i)
+    # Group the numbers that share unknown tiles, walking outward from each ungrouped one
+    groups, seen = [], set()
+    for start in range(len(constraints)):
+        if start in seen: continue
+        members, stack = [], [start]
+        seen.add(start)
+        while stack:
+            i = stack.pop()
+            members.append(i)
+            for tile in constraints[i][0]:
+                for j in by_tile[tile]:
+                    if j not in seen:
+                        seen.add(j)
+                        stack.append(j)
+        groups.append(sorted(members))
+    safe, mines = set(), set()
+    for members in groups:
+        tiles = {tile for i in members for tile in constraints[i][0]}
+        if len(tiles) <= limit:
+            solve_group([constraints[i] for i in members], safe, mines)
+            continue
+        for i in members:
+            near = {j for tile in constraints[i][0] for j in by_tile[tile]}
+            tiles = {tile for j in near for tile in constraints[j][0]}
+            if len(tiles) <= limit: solve_group([constraints[j] for j in sorted(near)], safe, mines)
+    return(safe-mines, mines)
+
+def solve_group(constraints, safe: set, mines: set) -> None:
+    """Enumerate the bomb arrangements over the unknown tiles of some numbers, adding the tiles
+    that are empty in all of them to safe and those bombed in all of them to mines"""
+    order = []
+    for tiles, _ in constraints:
+        for tile in tiles:
+            if tile not in order: order.append(tile)
+    index = {tile: k for k, tile in enumerate(order)}
+    bombs = [count for _, count in constraints]
+    placed = [0]*len(constraints)
+    open_tiles = [len(tiles) for tiles, _ in constraints]
+    touches = [[] for _ in order]
+    for c, (tiles, _) in enumerate(constraints):
+        for tile in tiles: touches[index[tile]].append(c)
+    counts, assignment = [0]*len(order), [0]*len(order)
+    solutions = 0
+    def place(k):
+        nonlocal solutions
+        if k == len(order):
+            solutions += 1
+            for i, value in enumerate(assignment): counts[i] += value
+            return
+        for value in (0, 1):
+            for c in touches[k]:
+                placed[c] += value
+                open_tiles[c] -= 1
+            if all(placed[c] <= bombs[c] <= placed[c]+open_tiles[c] for c in touches[k]):
+                assignment[k] = value
+                place(k+1)
+            for c in touches[k]:
+                placed[c] -= value
+                open_tiles[c] += 1
+        assignment[k] = 0
+    place(0)
+    if not solutions: return
+    for tile, count in zip(order, counts):
+        if not count: safe.add(tile)
+        elif count == solutions: mines.add(tile)
+
+def play(mine_map, solver = None) -> dict:
+    """Reveal whatever the solver proves safe, over and over, until it is stuck, returning how many
+    tiles were revealed and proven. Headless: the map's dirty rectangles are read as the record of
+    what each reveal changed, so nothing should be drawing the map meanwhile"""
+    solver = solver or Solver(mine_map)
+    solver.reveals = True
+    revealed, proven, rounds = solver.revealed, 0, 0
+    while True:
+        safe, mines = solver.deduce()
+        if not len(safe) and not len(mines): break
+        proven += len(safe)+len(mines)
+        rounds += 1
+    return({'revealed': solver.revealed-revealed, 'proven': proven, 'mines_found': int(np.count_nonzero(solver.mine)),
+        'rounds': rounds, **solver.stats})
+
+def make_solvable(mine_map, rng = random, report: Optional[GenerationReport] = None, max_rounds: int = 10000) -> int:
+    """Move bombs until every safe tile of mine_map can be revealed from its revealed start without
+    guessing, returning how many were moved or, with nowhere out of the way to put them, removed.
+    The map is left with only its start revealed and its blank region index rebuilt"""
+    report = report or GenerationReport()
+    np_rng = procgen.numpy_rng(rng)
+    # Moving bombs changes the blank regions, so reveals flood until the index is rebuilt
+    had_index, mine_map.zero_regions = mine_map.zero_regions is not None, None
+    # Bombs are only moved off the edge of what is revealed, lowering the numbers there, and onto
+    # tiles out of sight of it, raising only hidden numbers, so the start tile stays blank
+    start = np.argwhere(mine_map.revealed[...] & mine_map.blank())[:1]
+    if not len(start):
+        report.note('No-guess: no blank start to solve from')
+        return(0)
+    def reopen():
+        mine_map.revealed[...] = False
+        procgen.pop_clears(start[0], mine_map)
+    moved = removed = 0
+    solver, verifying = Solver(mine_map), False
+    for rounds in range(max_rounds+1):
+        with report.phase('no-guess verify' if verifying else 'no-guess solve'):
+            play(mine_map, solver)
+        hidden_safe = ~mine_map.revealed[...] & ~mine_map.explosive[...]
+        if not hidden_safe.any():
+            # Once everything is revealed, only what may have been found from the numbers the moves
+            # lowered needs finding again
+            with report.phase('no-guess rollback'):
+                if not solver.rollback(): break
+            verifying = True
+            continue
+        verifying = False
+        if rounds == max_rounds:
+            report.note(f'No-guess: gave up after {max_rounds} rounds with {np.count_nonzero(hidden_safe)} safe tiles unsolved')
+            break
+        # One bomb on the edge of what is revealed per REPAIR_SPACING square, near safe tiles still
+        # hidden, is moved to a hidden tile far from anything known, and solving carries on from where
+        # it was: the rest of what it proved is still true
+        with report.phase('no-guess repair'):
+            count, dropped = repair(mine_map, solver, hidden_safe, np_rng)
+        if not count+dropped:
+            report.note(f'No-guess: no bombs left to move, {np.count_nonzero(hidden_safe)} safe tiles unsolved')
+            break
+        moved, removed = moved+count, removed+dropped
+    if had_index: mine_map.zero_regions = build_zero_index(mine_map)
+    reopen()
+    mine_map.mark_dirty()
+    report.note(f'No-guess: moved {moved} bombs and removed {removed} in {rounds} rounds')
+    return(moved+removed)
+
+def repair(mine_map, solver: Solver, hidden_safe: np.ndarray, np_rng) -> Tuple[int, int]:
+    """One round of make_solvable's bomb moves for a stuck solver, returning how many bombs were moved
+    and how many removed for want of anywhere to put them"""
+    revealed, explosive = mine_map.revealed[...], mine_map.explosive[...]
+    known = revealed | solver.mine | solver.safe
+    # Only the tiles the solver knows nothing about are looked at one by one, and late on they are few
+    unknown = np.argwhere(~known)
+    bombs = explosive[unknown[:, 0], unknown[:, 1]]
+    unsolved = unknown[~bombs]
+    # The bombs next to numbers the solver could not place are where it would have to guess
+    tiles = unknown[bombs][near_any(revealed, unknown[bombs], 1)]
+    if not len(tiles): tiles = walling_bombs(revealed, explosive, unsolved)
+    if not len(tiles): return(0, 0)
+    tiles = tiles[np_rng.permutation(len(tiles))]
+    _, first = np.unique(tiles[:, 0]//REPAIR_SPACING+tiles[:, 1]//REPAIR_SPACING*mine_map.width, return_index=True)
+    sources = tiles[np.sort(first)]
+    # Bombs go far from anything known when there is room, and otherwise anywhere out of sight of the
+    # revealed tiles, which keeps their numbers and so the start as they were
+    candidates = unsolved[~near_any(revealed, unsolved, 1)]
+    room = candidates[~near_any(known, candidates, 2)]
+    if not len(room): room = candidates
+    destinations = room[np_rng.choice(len(room), min(len(sources), len(room)), replace=False)]
+    # With nowhere left to put them, the rest are taken off the map
+    removed = len(sources)-len(destinations)
+    procgen.move_bombs(mine_map, sources, destinations)
+    # The numbers around the moved bombs are lower now, so what was found from them is in doubt
+    xs, ys, _ = adjacent_coords(sources[:, 0], sources[:, 1], mine_map.width, mine_map.height)
+    xs, ys = np.concatenate([sources[:, 0], xs]), np.concatenate([sources[:, 1], ys])
+    solver.doubt(xs, ys)
+    solver.notice_tiles(xs, ys)
+    return(len(destinations), removed)
+
+def walling_bombs(revealed: np.ndarray, explosive: np.ndarray, unsolved: np.ndarray) -> np.ndarray:
+    """The hidden bombs next to revealed tiles nearest the (n, 2) unsolved tiles, or anywhere if
+    none is within REPAIR_REACH, looked for in a window around the unsolved tiles"""
+    if len(unsolved):
+        x0, y0 = np.maximum(unsolved.min(axis=0)-REPAIR_REACH-1, 0)
+        x1, y1 = np.minimum(unsolved.max(axis=0)+REPAIR_REACH+2, explosive.shape)
+        window = (slice(x0, x1), slice(y0, y1))
+        near = np.zeros((x1-x0, y1-y0), dtype=bool, order='F')
+        near[unsolved[:, 0]-x0, unsolved[:, 1]-y0] = True
+        # Tiles on the window's border may miss revealed neighbors outside it, but lie out of reach
+        edge = explosive[window] & ~revealed[window] & (count_adjacent(revealed[window]) > 0)
+        reach = 2
+        sources = edge & dilate_square(near, reach)
+        while not sources.any() and reach < REPAIR_REACH:
+            reach *= 2
+            sources = edge & dilate_square(near, reach)
+        if sources.any(): return(np.argwhere(sources)+(x0, y0))
+    return(np.argwhere(explosive & ~revealed & (count_adjacent(revealed) > 0)))
+
+def near_any(mask: np.ndarray, tiles: np.ndarray, radius: int) -> np.ndarray:
+    """Whether each of the (n, 2) tiles has a set tile of mask within radius tiles in any direction"""
+    width, height = mask.shape
+    found = np.zeros(len(tiles), dtype=bool)
+    for dx in range(-radius, radius+1):
+        # Clipping to the map only moves a look past the edge onto a tile that is within radius too
+        xs = np.clip(tiles[:, 0]+dx, 0, width-1)
+        for dy in range(-radius, radius+1):
+            found |= mask[xs, np.clip(tiles[:, 1]+dy, 0, height-1)]
+    return(found)
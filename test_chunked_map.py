@@ -0,0 +1,15 @@
+import numpy as np
+
+from chunked_map import ChunkedCells
+
+def test_chunk_edges_hold_their_share_of_bombs():
+    # The first two and last two lines of tiles along each axis, averaged over many chunks
+    lines, overall = [], []
+    for seed in range(2):
+        cells = ChunkedCells(512, 512, 25, seed)
+        for cx in range(4):
+            for cy in range(4):
+                expl = cells.layout(cx, cy)
+                lines.append([expl[i].mean() for i in (0, 1, -2, -1)]+[expl[:, i].mean() for i in (0, 1, -2, -1)])
+                overall.append(expl.mean())
+    assert np.abs(np.mean(lines, axis=0)-np.mean(overall)).max() < 0.05
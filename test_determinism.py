@@ -0,0 +1,25 @@
+import random
+
+import numpy as np
+import pytest
+
+import procgen
+
+GENERATORS = ['tendril', 'batched', 'parallel', 'noise']
+SEEDS = {'int': lambda: 7, 'random': lambda: random.Random(7), 'numpy': lambda: np.random.default_rng(7)}
+
+def cells(generator, playable, seed):
+    # The global generators are stirred first, so nothing may be drawn from them
+    random.seed()
+    np.random.seed()
+    return(np.asarray(procgen.generate_map(60, 40, 25, playable, generator=generator, seed=seed, workers=1).cells))
+
+@pytest.mark.parametrize('generator', GENERATORS)
+@pytest.mark.parametrize('playable', [True, False])
+@pytest.mark.parametrize('seed', list(SEEDS))
+def test_same_seed_same_map(generator, playable, seed):
+    assert np.array_equal(cells(generator, playable, SEEDS[seed]()), cells(generator, playable, SEEDS[seed]()))
+
+@pytest.mark.parametrize('generator', GENERATORS)
+def test_int_seed_matches_its_random(generator):
+    assert np.array_equal(cells(generator, True, 7), cells(generator, True, random.Random(7)))
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import procgen
+import tile_types
+from game_state import GameState
+from regions import label_regions
+
+@pytest.mark.parametrize('region_index', [True, False])
+def test_region_reveal_leaves_flags(region_index):
+    mine_map = procgen.generate_map(120, 90, 15, True, region_index=region_index, generator='batched', seed=4)
+    mine_map.revealed[...] = False
+    blank = (np.asarray(mine_map.cells) & tile_types.BLANK_BITS) == 0
+    labels, boxes = label_regions(blank)
+    sizes = np.bincount(labels.ravel(order='K'))[1:]
+    xs, ys = np.nonzero(labels == sizes.argmax()+1)
+    state = GameState(mine_map)
+    flagged, clicked = (xs[0], ys[0]), (xs[-1], ys[-1])
+    state.toggle_flag(flagged)
+    state.reveal(clicked)
+    assert mine_map.flagged[flagged] and not mine_map.revealed[flagged]
+    assert mine_map.revealed[clicked]
+    assert state.flags == 1 and state.mines_left == state.mines-1
+    state.toggle_flag(flagged)
+    assert state.flags == 0 and not mine_map.flagged[flagged]
+    state.reveal(flagged)
+    assert mine_map.revealed[flagged]
+    assert state.safe_remaining == np.count_nonzero(~mine_map.explosive[...] & ~mine_map.revealed[...])
+
+def test_counts_carry_on_after_a_loss():
+    mine_map = procgen.generate_map(60, 40, 25, True, generator='batched', seed=2)
+    state = GameState(mine_map)
+    bombs = np.argwhere(mine_map.explosive[...])
+    state.reveal(tuple(bombs[0]))
+    assert state.status == 'lost'
+    hidden = np.argwhere(~mine_map.explosive[...] & ~mine_map.revealed[...])
+    before = state.safe_remaining
+    state.reveal_many(hidden[:10, 0], hidden[:10, 1])
+    state.reveal(tuple(bombs[1]))
+    assert state.status == 'lost' and state.exploded == tuple(bombs[0])
+    assert state.safe_remaining < before
+    assert state.safe_remaining == np.count_nonzero(~mine_map.explosive[...] & ~mine_map.revealed[...])
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import analysis
+import procgen
+from neighbors import count_adjacent
+
+@pytest.mark.parametrize('generator', ['tendril', 'batched'])
+def test_tiny_maps_run_out_of_seed_spots(generator):
+    # No bombs wanted on a map too small to start seeds anywhere left on it
+    for seed in range(12):
+        mine_map = procgen.generate_map(10, 3, 0, True, generator=generator, seed=seed)
+        assert mine_map.revealed[...].any()
+
+def test_parallel_blocks_leave_no_seam():
+    # Averaged over a few maps, the tiles either side of the block edges hold as many bombs as the rest
+    size = procgen.PARALLEL_BLOCK
+    before, after, overall = [], [], []
+    for seed in range(4):
+        expl = procgen.generate_map(2*size, 2*size, 25, True, generator='parallel', seed=seed, workers=1).explosive[...]
+        before += [expl[size-16:size].mean(), expl[:, size-16:size].mean()]
+        after += [expl[size:size+16].mean(), expl[:, size:size+16].mean()]
+        overall.append(expl.mean())
+    assert abs(np.mean(before)-np.mean(overall)) < 0.04
+    assert abs(np.mean(after)-np.mean(overall)) < 0.04
+
+def test_unplayable_maps_are_analyzed_by_their_bombs():
+    mine_map = procgen.generate_map(120, 90, 25, False, generator='batched', seed=1, analyze=True)
+    # The same map with its numbers filled in, as a playable one would have them
+    mine_map.numbomb[...] = count_adjacent(mine_map.explosive[...])
+    counted = analysis.analyze(mine_map)
+    for name in ('zero_regions', 'largest_opening', 'safe_regions'):
+        assert mine_map.report.metrics[name] == counted[name]
+    assert counted['zero_regions']['largest'] < counted['safe_regions']['largest']
@@ -0,0 +1,45 @@
+import numpy as np
+
+import procgen
+import solver
+
+def test_pair_rule_subset_safe():
+    assert solver.pair_rule([((1, 2), 1), ((1, 2, 3), 1)]) == ({3}, set())
+
+def test_pair_rule_subset_mines():
+    assert solver.pair_rule([((1, 2), 1), ((1, 2, 3, 4), 3)]) == (set(), {3, 4})
+
+def test_pair_rule_overlap():
+    assert solver.pair_rule([((1, 2), 1), ((2, 3, 4), 3)]) == ({1}, {3, 4})
+
+def test_play_never_reveals_a_bomb():
+    for seed in range(3):
+        mine_map = procgen.generate_map(120, 90, 25, True, generator='batched', seed=seed)
+        solver.play(mine_map)
+        assert not (mine_map.revealed[...] & mine_map.explosive[...]).any()
+
+def test_reveal_notices_the_tiles_it_opened():
+    mine_map = procgen.generate_map(200, 200, 25, True, generator='batched', seed=1)
+    tile = np.argwhere(mine_map.blank() & ~mine_map.revealed[...])[0]
+    # Drawn already, so nothing is left in the map's dirty list to go by
+    mine_map.dirty = []
+    play = solver.Solver(mine_map, reveals=True)
+    play.pending[:] = False
+    assert play.reveal(tile) > 0
+    assert play.pending[tile[0]//solver.SOLVER_BLOCK, tile[1]//solver.SOLVER_BLOCK]
+
+def test_reveal_of_a_flagged_blank_tile_opens_nothing():
+    mine_map = procgen.generate_map(200, 200, 25, True, generator='batched', seed=1)
+    tile = np.argwhere(mine_map.blank() & ~mine_map.revealed[...])[0]
+    mine_map.flagged[...] = ~mine_map.revealed[...]
+    mine_map.dirty = []
+    play = solver.Solver(mine_map, reveals=True)
+    play.pending[:] = False
+    assert play.reveal(tile) == 0
+    assert not play.pending.any()
+
+def test_no_guess_maps_solve_from_their_start_alone():
+    for seed in range(2):
+        mine_map = procgen.generate_map(100, 100, 25, True, generator='batched', seed=seed, no_guess=True)
+        solver.play(mine_map)
+        assert not (~mine_map.revealed[...] & ~mine_map.explosive[...]).any()
@@ -1,4 +1,3 @@
-from typing import Tuple
 import numpy as np
 
 graphic_dt = np.dtype(
@@ -9,36 +8,28 @@ graphic_dt = np.dtype(
     ]
 )
 
-tile_dt = np.dtype(
-    [
-        ('revealed', np.bool),
-        ('flagged', np.bool),
-        ('explosive', np.bool),
-        ('numbomb', np.int32),
-        ('light', graphic_dt)
-    ]
-)
-
-def new_tile(
-    *, revealed: bool, flagged: bool, explosive: bool, numbomb: int,
-        light: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]]
-    ) -> np.ndarray:
-    """Helper Function to make a tile with associated attributes"""
-    return np.array((revealed, flagged, explosive, numbomb, light), dtype=tile_dt)
+# Every tile of a GameMap is a single byte: the low bits hold its numbomb, the high bits its state
+NUMBOMB = 0x0F
+EXPLOSIVE = 0x10
+REVEALED = 0x20
+FLAGGED = 0x40
+# A tile with none of these bits set is a blank safe tile
+BLANK_BITS = NUMBOMB | EXPLOSIVE
 
 SHROUD = np.array((ord(' '), (255, 255, 255), (0, 0, 0)), dtype=graphic_dt)
+SAFE_LIGHT = np.array((ord('-'), (255, 255, 255), (130, 110, 50)), dtype=graphic_dt)
+BOMB_LIGHT = np.array((ord('\\'), (255, 255, 255), (130, 110, 50)), dtype=graphic_dt)
+FLAG_LIGHT = np.array((ord('F'), (0, 0, 0), (130, 110, 50)), dtype=graphic_dt)
 
-safe = new_tile(
-    revealed = False,
-    flagged = False,
-    explosive = False,
-    numbomb = 0,
-    light=(ord('-'), (255, 255, 255), (130, 110, 50))
-)
-bomb = new_tile(
-    revealed = False,
-    flagged = False,
-    explosive = True,
-    numbomb = 0,
-    light=(ord('\\'), (255, 255, 255), (130, 110, 50))
-)
+def cell_graphic(cell: int) -> np.ndarray:
+    """Return how a tile with the given cell byte is drawn"""
+    if cell & FLAGGED: return(FLAG_LIGHT)
+    if not cell & REVEALED: return(SHROUD)
+    if cell & EXPLOSIVE: return(BOMB_LIGHT)
+    if not cell & NUMBOMB: return(SAFE_LIGHT)
+    light = SAFE_LIGHT.copy()
+    light['ch'] = ord('0') + (cell & NUMBOMB)
+    return(light)
+
+# Drawing a map is a single lookup of its cell bytes in this table
+CELL_GRAPHICS = np.array([cell_graphic(cell) for cell in range(256)], dtype=graphic_dt)